@@ -1,170 +1,2209 @@
 import dash
-from dash import dcc, html, dash_table, Input, Output, State, ALL, ctx
+from dash import dcc, html, dash_table, Input, Output, State, ALL, ctx, Patch, ClientsideFunction
 import dash_bootstrap_components as dbc
 import pandas as pd
+import numpy as np
 import os
-import base64
-from datetime import datetime
-from flask import send_from_directory
+import re
+import io
+import csv
+import json
+import hmac
+import hashlib
+import random
+import shutil
+import cProfile
+import logging
+import multiprocessing
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, BrokenExecutor, as_completed
+from datetime import datetime, timedelta
+from dateutil.tz import tzlocal
+from functools import lru_cache
+from types import MappingProxyType
+from flask import send_file, request, jsonify, g, has_request_context, Response, abort
+from urllib.parse import quote
+
+import traitements_pdf
+# Aperçus des PDF (facultatif) : pip install pypdfium2 pillow
+from traitements_pdf import pdfium
 
 # =====================================================
 # CONFIGURATION INITIALE
 # =====================================================
 
+MOT_DE_PASSE_ADMIN = os.environ.get("NORIA_MOT_DE_PASSE", "Noria2026")
 FICHIER_DONNEES = "mon_suivi_general.csv"
+FICHIER_BASE = "mon_suivi_general.db"
+# "sqlite" (par défaut) ou "csv" pour l'ancien fonctionnement fichier unique
+BACKEND_STOCKAGE = os.environ.get("NORIA_STOCKAGE", "sqlite")
 DOSSIER_FICHIERS = "fichiers_chantier"
-LISTE_VILLAS = [f"Villa {i}" for i in range(1, 109)]
-LISTE_TACHES = [
-    "1. Réception des axes",
-    "2. Réception fond de fouille",
-    "3. Réception coffrage et ferraillage semelles",
-    "4. Réception béton des semelles (Labo)"
-]
+# Taille des blocs lus/écrits lors des uploads : la mémoire reste constante
+TAILLE_BLOC = 1024 * 1024
+# Nombre d'écritures en parallèle lors d'un import groupé
+TRAVAILLEURS_LOT = 4
+# Les liens vers les PDF portent ?v=<version> : une URL versionnée ne change jamais
+# et peut rester un an dans le cache du navigateur
+DUREE_CACHE_PDF = 365 * 24 * 3600
+# Derrière nginx : NORIA_X_ACCEL_PREFIXE=/interne/fichiers/ (location "internal" pointant
+# sur fichiers_chantier) laisse nginx envoyer les octets ; NORIA_X_SENDFILE=1 pour Apache/lighttpd
+X_ACCEL_PREFIXE = os.environ.get("NORIA_X_ACCEL_PREFIXE")
+X_SENDFILE = os.environ.get("NORIA_X_SENDFILE") == "1"
+# Intervalle de sondage de /version par les navigateurs ouverts (modifications des autres postes)
+INTERVALLE_SYNCHRO_MS = int(os.environ.get("NORIA_SYNCHRO_MS", "5000"))
+# Historique des statuts : un instantané complet tous les N changements, pour reconstruire
+# l'état à une date sans rejouer tout le journal
+INTERVALLE_INSTANTANES = 500
+# Miniatures de la première page des PDF, rangées par empreinte SHA-256
+DOSSIER_APERCUS = os.environ.get("NORIA_APERCUS", "apercus_chantier")
+LARGEUR_APERCU = 320
+TRAVAILLEURS_APERCU = 2
+# Travaux en arrière-plan (rangement des uploads, vérification d'intégrité) : fils d'exécution
+# par worker ; un travail resté "en cours" sans nouvelle pendant ce délai (worker arrêté) est repris
+TRAVAILLEURS_FOND = 2
+DELAI_REPRISE_TRAVAUX = 300
+CONSERVATION_TRAVAUX = 7 * 24 * 3600
+# Recherche plein texte : texte des PDF extrait en arrière-plan (pdfium), indexé par SQLite FTS5
+TRAVAILLEURS_TEXTE = 1
+MAX_CARACTERES_TEXTE = 500000
+RESULTATS_RECHERCHE = 50
+
+# Schéma du projet : tâches, villas et documents attendus par tâche.
+# NORIA_PROJET peut pointer vers un fichier JSON de même forme pour ajouter
+# des tâches ou des villas sans modifier le code.
+FICHIER_PROJET = os.environ.get("NORIA_PROJET")
+SCHEMA_PAR_DEFAUT = {
+    "villas": {"prefixe": "Villa", "nombre": 108},
+    "taches": [
+        {
+            "nom": "1. Réception des axes",
+            "documents": {
+                "Autocontrole_Archi": "📂 Autocontrôle Archi",
+                "PV_Archi": "📄 PV Archi",
+                "Scan_Topo": "📐 Scan Topo"
+            }
+        },
+        {
+            "nom": "2. Réception fond de fouille",
+            "documents": {"Document_Unique": "📄 Document Unique"}
+        },
+        {
+            "nom": "3. Réception coffrage et ferraillage semelles",
+            "documents": {"Autocontrole": "📂 Autocontrôle", "PV_Reception": "📄 PV Réception"}
+        },
+        {
+            # Mêmes documents que l'ancienne recherche par sous-chaîne ("semelles" avant "béton"),
+            # pour ne pas masquer les fichiers déjà déposés
+            "nom": "4. Réception béton des semelles (Labo)",
+            "documents": {"Autocontrole": "📂 Autocontrôle", "PV_Reception": "📄 PV Réception"}
+        }
+    ]
+}
+DOCS_PAR_DEFAUT = MappingProxyType({"Document": "📄 Document"})
+MOTIF_TYPE_DOC = re.compile(r"^[A-Za-z0-9_]+$")
+
+def normaliser_nom(texte):
+    return texte.replace(" ", "_").replace(".", "").replace(",", "")
+
+def nom_fichier_document(tache, villa, type_doc):
+    """Nom du PDF stocké pour une tâche/villa/type - toujours .pdf"""
+    return f"{normaliser_nom(f'{tache}_{villa}_{type_doc}')}.pdf"
+
+def charger_schema(schema):
+    """Valide le schéma du projet et retourne (villas, tâches, documents par tâche) figés"""
+    def invalide(message):
+        return ValueError(f"Schéma projet invalide : {message}")
+    
+    if not isinstance(schema, dict):
+        raise invalide("objet JSON attendu")
+    villas = schema.get("villas")
+    if isinstance(villas, dict):
+        nombre = villas.get("nombre", 0)
+        prefixe = villas.get("prefixe", "Villa")
+        # bool est un int : on l'écarte explicitement
+        if not isinstance(nombre, int) or isinstance(nombre, bool) or not isinstance(prefixe, str):
+            raise invalide("'villas' : 'nombre' doit être un entier et 'prefixe' un texte")
+        villas = [f"{prefixe} {i}" for i in range(1, nombre + 1)]
+    if not isinstance(villas, list) or not villas or not all(isinstance(v, str) and v.strip() for v in villas):
+        raise invalide("'villas' doit être une liste de noms ou {prefixe, nombre}")
+    if len(set(villas)) != len(villas):
+        raise invalide("noms de villas en double")
+    
+    taches = schema.get("taches") or []
+    if not isinstance(taches, list) or not taches:
+        raise invalide("'taches' doit être une liste non vide")
+    documents = {}
+    for tache in taches:
+        if not isinstance(tache, dict):
+            raise invalide(f"tâche {tache!r} : objet {{nom, documents}} attendu")
+        nom = tache.get("nom")
+        if not isinstance(nom, str) or not nom.strip():
+            raise invalide(f"tâche sans nom : {tache!r}")
+        if nom in documents:
+            raise invalide(f"tâche en double : {nom}")
+        types_docs = tache.get("documents") or DOCS_PAR_DEFAUT
+        if not isinstance(types_docs, (dict, MappingProxyType)):
+            raise invalide(f"tâche {nom} : 'documents' doit associer type -> libellé")
+        for type_doc, libelle in types_docs.items():
+            # Le type sert dans les noms de fichiers et les URLs d'upload
+            if not isinstance(type_doc, str) or not MOTIF_TYPE_DOC.match(type_doc):
+                raise invalide(f"type de document {type_doc!r} (lettres, chiffres et _ uniquement)")
+            if not isinstance(libelle, str):
+                raise invalide(f"libellé du type {type_doc} : texte attendu")
+        documents[nom] = MappingProxyType(dict(types_docs))
+    
+    # Deux cases ne doivent jamais partager un fichier : "5. Coffrage, voiles" et
+    # "5 Coffrage voiles" donnent le même nom une fois normalisés. La normalisation
+    # se fait caractère par caractère, on la calcule donc une fois par morceau.
+    villas_normalisees = [f"_{normaliser_nom(v)}_" for v in villas]
+    morceaux = [(normaliser_nom(nom), normaliser_nom(type_doc))
+                for nom, types_docs in documents.items() for type_doc in types_docs]
+    total = len(morceaux) * len(villas)
+    if len({t + v + d for t, d in morceaux for v in villas_normalisees}) != total:
+        # Cas rare : on refait le parcours pour nommer les deux cases en conflit
+        fichiers = {}
+        for nom, types_docs in documents.items():
+            for type_doc in types_docs:
+                for villa in villas:
+                    cle = (nom, villa, type_doc)
+                    autre = fichiers.setdefault(nom_fichier_document(*cle), cle)
+                    if autre is not cle:
+                        raise invalide(f"{cle} et {autre} donnent le même nom de fichier "
+                                       f"{nom_fichier_document(*cle)!r}")
+    
+    return list(villas), [t["nom"] for t in taches], MappingProxyType(documents)
+
+def lire_schema():
+    if FICHIER_PROJET:
+        with open(FICHIER_PROJET, encoding="utf-8") as f:
+            return json.load(f)
+    return SCHEMA_PAR_DEFAUT
+
+# Chargé et validé une seule fois au démarrage, partagé par tous les callbacks
+LISTE_VILLAS, LISTE_TACHES, TYPES_DOCS = charger_schema(lire_schema())
+# Position de chaque tâche / villa : décodage en temps constant des identifiants
+INDEX_TACHES = {tache: i for i, tache in enumerate(LISTE_TACHES)}
+INDEX_VILLAS = {villa: i for i, villa in enumerate(LISTE_VILLAS)}
+STATUTS = ["À faire", "En cours", "OK", "Non Conforme"]
+# Table des codes : en mémoire, chaque case vaut l'indice uint8 de son statut dans STATUTS
+CODES_STATUTS = {statut: code for code, statut in enumerate(STATUTS)}
+TYPE_STATUTS = pd.CategoricalDtype(STATUTS, ordered=True)
+TABLE_STATUTS = np.array(STATUTS, dtype=object)
+COULEURS_STATUTS = {
+    'OK': '#d4edda',
+    'Non Conforme': '#f8d7da',
+    'En cours': '#fff3cd',
+    'À faire': '#ffffff'
+}
+# Identifiants courts des colonnes de tâches dans le tableau (une ligne par villa)
+COLONNES_TACHES = {f"t{i}": i for i in range(len(LISTE_TACHES))}
+# ... et des colonnes de complétude documentaire associées
+COLONNES_DOCS = {f"d{i}": i for i in range(len(LISTE_TACHES))}
+# Nombre de villas envoyées au navigateur par page du tableau
+PAGE_TAILLE = 25
 
 # Créer le dossier de fichiers s'il n'existe pas
 if not os.path.exists(DOSSIER_FICHIERS):
     os.makedirs(DOSSIER_FICHIERS)
+if pdfium is not None:
+    os.makedirs(DOSSIER_APERCUS, exist_ok=True)
+
+# =====================================================
+# JOURNAL ET MÉTRIQUES (désactivés par défaut)
+# =====================================================
+
+# NORIA_LOG=DEBUG pour voir le détail des opérations fichiers
+logging.basicConfig(level=os.environ.get("NORIA_LOG", "WARNING").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger("noria")
+
+# NORIA_METRIQUES=1 active les mesures et la route /metrics (format Prometheus)
+METRIQUES_ACTIVES = os.environ.get("NORIA_METRIQUES") == "1"
+# Profilage cProfile d'un échantillon de requêtes, gardé seulement si elles sont lentes
+PROFIL_SEUIL_MS = float(os.environ.get("NORIA_PROFIL_SEUIL_MS", "0"))
+PROFIL_TAUX = float(os.environ.get("NORIA_PROFIL_TAUX", "0.1"))
+DOSSIER_PROFILS = os.environ.get("NORIA_PROFIL_DOSSIER", "profils")
+SEUILS_DUREE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Metriques:
+    """Compteurs par route Flask / callback Dash, propres à chaque worker"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.requetes = {}
+        self.stockage = [0, 0.0]
+        self.fs = 0
+
+    def noter_requete(self, cible, duree, octets, duree_stockage, appels_fs):
+        with self._verrou:
+            stats = self.requetes.get(cible)
+            if stats is None:
+                stats = self.requetes[cible] = {
+                    'buckets': [0] * len(SEUILS_DUREE), 'nombre': 0, 'duree': 0.0,
+                    'octets': 0, 'stockage': 0.0, 'fs': 0
+                }
+            for i, seuil in enumerate(SEUILS_DUREE):
+                if duree <= seuil:
+                    stats['buckets'][i] += 1
+            stats['nombre'] += 1
+            stats['duree'] += duree
+            stats['octets'] += octets
+            stats['stockage'] += duree_stockage
+            stats['fs'] += appels_fs
+
+    def noter_stockage(self, duree):
+        if not METRIQUES_ACTIVES:
+            return
+        with self._verrou:
+            self.stockage[0] += 1
+            self.stockage[1] += duree
+        if has_request_context():
+            g.noria_stockage = g.get('noria_stockage', 0.0) + duree
+
+    def noter_fs(self, nombre=1):
+        if not METRIQUES_ACTIVES:
+            return
+        with self._verrou:
+            self.fs += nombre
+        if has_request_context():
+            g.noria_fs = g.get('noria_fs', 0) + nombre
+
+    def exposition(self, statistiques_cache):
+        """Texte au format d'exposition Prometheus"""
+        def etiquette(valeur):
+            return valeur.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        
+        lignes = [
+            "# HELP noria_requete_duree_secondes Durée des requêtes HTTP et callbacks Dash.",
+            "# TYPE noria_requete_duree_secondes histogram"
+        ]
+        with self._verrou:
+            requetes = {cible: dict(stats, buckets=list(stats['buckets'])) for cible, stats in self.requetes.items()}
+            stockage, fs = list(self.stockage), self.fs
+        for cible, stats in sorted(requetes.items()):
+            c = etiquette(cible)
+            for seuil, nombre in zip(SEUILS_DUREE, stats['buckets']):
+                lignes.append(f'noria_requete_duree_secondes_bucket{{cible="{c}",le="{seuil}"}} {nombre}')
+            lignes.append(f'noria_requete_duree_secondes_bucket{{cible="{c}",le="+Inf"}} {stats["nombre"]}')
+            lignes.append(f'noria_requete_duree_secondes_sum{{cible="{c}"}} {stats["duree"]}')
+            lignes.append(f'noria_requete_duree_secondes_count{{cible="{c}"}} {stats["nombre"]}')
+        for nom, cle, aide in [
+            ("noria_reponse_octets_total", 'octets', "Taille cumulée des réponses."),
+            ("noria_requete_stockage_secondes_total", 'stockage', "Temps passé à lire le stockage des statuts."),
+            ("noria_requete_fs_appels_total", 'fs', "Appels au système de fichiers (stat, scandir, écritures).")
+        ]:
+            lignes += [f"# HELP {nom} {aide}", f"# TYPE {nom} counter"]
+            for cible, stats in sorted(requetes.items()):
+                lignes.append(f'{nom}{{cible="{etiquette(cible)}"}} {stats[cle]}')
+        lignes += [
+            "# HELP noria_stockage_chargements_total Accès au stockage des statuts.",
+            "# TYPE noria_stockage_chargements_total counter",
+            f"noria_stockage_chargements_total {stockage[0]}",
+            "# HELP noria_stockage_secondes_total Temps total d'accès au stockage des statuts.",
+            "# TYPE noria_stockage_secondes_total counter",
+            f"noria_stockage_secondes_total {stockage[1]}",
+            "# HELP noria_fs_appels_total Appels au système de fichiers.",
+            "# TYPE noria_fs_appels_total counter",
+            f"noria_fs_appels_total {fs}",
+            "# HELP noria_cache_statuts_total Accès au cache des statuts.",
+            "# TYPE noria_cache_statuts_total counter",
+            f'noria_cache_statuts_total{{resultat="hit"}} {statistiques_cache["hits"]}',
+            f'noria_cache_statuts_total{{resultat="miss"}} {statistiques_cache["misses"]}'
+        ]
+        return "\n".join(lignes) + "\n"
+
+metriques = Metriques()
 
 # =====================================================
 # FONCTIONS UTILITAIRES
 # =====================================================
 
+def matrice_vide():
+    """Matrice des statuts initiale (tâches x villas, codes uint8) : tout est à faire"""
+    return np.full((len(LISTE_TACHES), len(LISTE_VILLAS)), CODES_STATUTS["À faire"], dtype=np.uint8)
+
+def coder_statuts(valeurs):
+    """Statuts en chaînes -> codes uint8, en une opération (valeur vide ou inconnue : À faire)"""
+    valeurs = np.asarray(valeurs, dtype=object)
+    codes = pd.Categorical(valeurs.ravel(), dtype=TYPE_STATUTS).codes
+    return np.where(codes < 0, CODES_STATUTS["À faire"], codes).astype(np.uint8).reshape(valeurs.shape)
+
+def matrice_depuis_lignes(lignes):
+    """[(tâche, villa, statut)] -> matrice de codes ; cases absentes : À faire, hors schéma : ignorées"""
+    codes = matrice_vide()
+    if lignes:
+        taches, villas, statuts = zip(*lignes)
+        i = pd.Index(LISTE_TACHES).get_indexer(taches)
+        j = pd.Index(LISTE_VILLAS).get_indexer(villas)
+        connues = (i >= 0) & (j >= 0)
+        codes[i[connues], j[connues]] = coder_statuts(statuts)[connues]
+    return codes
+
+def tableau_statuts(codes):
+    """Matrice de codes -> tableau de chaînes tâches x villas (fichier CSV, compatibilité)"""
+    return pd.DataFrame(TABLE_STATUTS[codes], index=LISTE_TACHES, columns=LISTE_VILLAS)
+
+class StockageCSV:
+    """Stockage historique : tout le tableau dans un seul fichier CSV"""
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+
+    def signature(self):
+        # mtime + taille : suffisant pour détecter une écriture d'un autre worker
+        metriques.noter_fs()
+        try:
+            st = os.stat(self.chemin)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def charger(self):
+        """Retourne (matrice de codes, signature) lues depuis le disque"""
+        signature = self.signature()
+        if signature is None:
+            codes = matrice_vide()
+            return codes, self._ecrire(codes)
+        df = pd.read_csv(self.chemin, index_col=0).reindex(index=LISTE_TACHES, columns=LISTE_VILLAS)
+        return coder_statuts(df.to_numpy()), signature
+
+    def sauvegarder(self, codes):
+        return self._ecrire(codes)
+
+    def ecrire_statuts(self, changements):
+        """Lecture-modification-écriture du fichier complet pour tout le lot, retourne (signature avant, après)"""
+        codes, avant = self.charger()
+        for tache, villa, statut in changements:
+            codes[INDEX_TACHES[tache], INDEX_VILLAS[villa]] = CODES_STATUTS[statut]
+        return avant, self._ecrire(codes)
+
+    def statuts_a_la_date(self, horodatage):
+        """Pas d'historique avec le stockage CSV"""
+        return None
+
+    def premiere_date(self):
+        return None
+
+    def evenements(self, depuis=None, statut=None):
+        return None
+
+    def changements_par_semaine(self, depuis, nb_semaines, statuts):
+        return None
+
+    def _ecrire(self, codes):
+        # Écriture atomique : les autres workers ne lisent jamais un fichier à moitié écrit
+        chemin_tmp = f"{self.chemin}.tmp"
+        tableau_statuts(codes).to_csv(chemin_tmp)
+        os.replace(chemin_tmp, self.chemin)
+        return self.signature()
+
+def ouvrir_sqlite(chemin):
+    """Une connexion par opération : sûr avec les workers gunicorn (fork) et les threads"""
+    conn = sqlite3.connect(chemin, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return _ConnexionFermee(conn)
+
+def fts5_disponible():
+    """Vrai si le SQLite de Python est compilé avec FTS5 (recherche plein texte)"""
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE essai USING fts5(texte)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+class _ConnexionFermee:
+    """Context manager qui ferme la connexion SQLite (et annule une transaction en cours)"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.conn.in_transaction:
+            self.conn.execute("ROLLBACK")
+        self.conn.close()
+
+class StockageSQLite:
+    """Stockage SQLite (WAL) : une ligne par case, écritures unitaires et transactionnelles"""
+
+    def __init__(self, chemin, csv_a_migrer=None):
+        self.chemin = chemin
+        with self._connexion() as conn:
+            # Le mode WAL est persistant : lecteurs et écrivain ne se bloquent plus
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS statuts (
+                    tache TEXT NOT NULL,
+                    villa TEXT NOT NULL,
+                    statut TEXT NOT NULL,
+                    PRIMARY KEY (tache, villa)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (cle TEXT PRIMARY KEY, valeur INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('version', 0)")
+            # Journal des changements, en ajout seul (date = horodatage Unix)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS historique_statuts (
+                    id INTEGER PRIMARY KEY,
+                    date REAL NOT NULL,
+                    tache TEXT NOT NULL,
+                    villa TEXT NOT NULL,
+                    ancien TEXT NOT NULL,
+                    nouveau TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS historique_par_date ON historique_statuts (date)")
+            # Tableau complet après l'événement id_evenement : JSON compressé [[tâche, villa, statut], ...]
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS instantanes (
+                    id_evenement INTEGER PRIMARY KEY,
+                    date REAL NOT NULL,
+                    statuts BLOB NOT NULL
+                )
+            """)
+        if csv_a_migrer:
+            self._migrer_csv(csv_a_migrer)
+        self._reparer_instantanes()
+        # Point de départ de l'historique : l'état au premier lancement avec journal
+        with self._connexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM instantanes LIMIT 1").fetchone() is None:
+                self._instantane(conn, time.time())
+            conn.execute("COMMIT")
+
+    def _connexion(self):
+        return ouvrir_sqlite(self.chemin)
+
+    def _migrer_csv(self, chemin_csv):
+        """Import unique de l'ancien CSV (ignoré s'il a déjà été fait)"""
+        if not os.path.exists(chemin_csv):
+            return
+        with self._connexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            deja_fait = conn.execute("SELECT 1 FROM meta WHERE cle = 'migration_csv'").fetchone()
+            if deja_fait:
+                conn.execute("ROLLBACK")
+                return
+            df = pd.read_csv(chemin_csv, index_col=0)
+            conn.executemany(
+                "INSERT OR REPLACE INTO statuts VALUES (?, ?, ?)",
+                [(tache, villa, statut) for (tache, villa), statut in df.stack().items()]
+            )
+            conn.execute("INSERT INTO meta VALUES ('migration_csv', strftime('%s', 'now'))")
+            conn.execute("UPDATE meta SET valeur = valeur + 1 WHERE cle = 'version'")
+            conn.execute("COMMIT")
+
+    def _reparer_instantanes(self):
+        """Correction unique des instantanés pris par sauvegarder avant l'écriture de son lot : les
+        événements de ce lot (même date, id au plus celui de l'instantané) y sont rejoués. Sans effet
+        sur un instantané correct, qui contient déjà ces statuts"""
+        with self._connexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM meta WHERE cle = 'instantanes_repares'").fetchone():
+                conn.execute("ROLLBACK")
+                return
+            for id_evenement, date, statuts in conn.execute("SELECT * FROM instantanes").fetchall():
+                lot = conn.execute(
+                    "SELECT tache, villa, nouveau FROM historique_statuts WHERE date = ? AND id <= ? ORDER BY id",
+                    (date, id_evenement)
+                ).fetchall()
+                if not lot:
+                    continue
+                etat = {(tache, villa): statut for tache, villa, statut in json.loads(zlib.decompress(statuts))}
+                etat.update(((tache, villa), statut) for tache, villa, statut in lot)
+                lignes = [[tache, villa, statut] for (tache, villa), statut in etat.items()]
+                conn.execute(
+                    "UPDATE instantanes SET statuts = ? WHERE id_evenement = ?",
+                    (zlib.compress(json.dumps(lignes, ensure_ascii=False).encode()), id_evenement)
+                )
+            conn.execute("INSERT INTO meta VALUES ('instantanes_repares', strftime('%s', 'now'))")
+            conn.execute("COMMIT")
+
+    def signature(self):
+        with self._connexion() as conn:
+            return conn.execute("SELECT valeur FROM meta WHERE cle = 'version'").fetchone()[0]
+
+    def charger(self):
+        """Retourne (matrice de codes, signature) lues dans la même transaction"""
+        with self._connexion() as conn:
+            conn.execute("BEGIN")
+            signature = conn.execute("SELECT valeur FROM meta WHERE cle = 'version'").fetchone()[0]
+            lignes = conn.execute("SELECT tache, villa, statut FROM statuts").fetchall()
+            conn.execute("COMMIT")
+        return matrice_depuis_lignes(lignes), signature
+
+    def _journaliser(self, conn, changements):
+        """Ajoute [(tâche, villa, ancien, nouveau)] au journal ; instantané tous les INTERVALLE_INSTANTANES événements"""
+        if not changements:
+            return
+        maintenant = time.time()
+        conn.executemany(
+            "INSERT INTO historique_statuts (date, tache, villa, ancien, nouveau) VALUES (?, ?, ?, ?, ?)",
+            [(maintenant,) + changement for changement in changements]
+        )
+        dernier = conn.execute("SELECT MAX(id) FROM historique_statuts").fetchone()[0]
+        dernier_instantane = conn.execute("SELECT MAX(id_evenement) FROM instantanes").fetchone()[0] or 0
+        if dernier - dernier_instantane >= INTERVALLE_INSTANTANES:
+            self._instantane(conn, maintenant)
+
+    def _instantane(self, conn, date):
+        dernier = conn.execute("SELECT COALESCE(MAX(id), 0) FROM historique_statuts").fetchone()[0]
+        lignes = conn.execute("SELECT tache, villa, statut FROM statuts").fetchall()
+        conn.execute(
+            "INSERT OR REPLACE INTO instantanes VALUES (?, ?, ?)",
+            (dernier, date, zlib.compress(json.dumps(lignes, ensure_ascii=False).encode()))
+        )
+
+    def statuts_a_la_date(self, horodatage):
+        """Matrice des statuts telle qu'elle était à cet horodatage : dernier instantané antérieur, puis au
+        plus INTERVALLE_INSTANTANES événements rejoués. None si la date précède le début de l'historique"""
+        with self._connexion() as conn:
+            conn.execute("BEGIN")
+            instantane = conn.execute(
+                "SELECT id_evenement, statuts FROM instantanes WHERE date <= ? ORDER BY id_evenement DESC LIMIT 1",
+                (horodatage,)
+            ).fetchone()
+            if instantane is None:
+                conn.execute("COMMIT")
+                return None
+            evenements = conn.execute(
+                "SELECT tache, villa, nouveau FROM historique_statuts WHERE id > ? AND date <= ? ORDER BY id",
+                (instantane[0], horodatage)
+            ).fetchall()
+            conn.execute("COMMIT")
+        etat = {(tache, villa): statut for tache, villa, statut in json.loads(zlib.decompress(instantane[1]))}
+        for tache, villa, statut in evenements:
+            etat[(tache, villa)] = statut
+        return matrice_depuis_lignes([(tache, villa, statut) for (tache, villa), statut in etat.items()])
+
+    def premiere_date(self):
+        """Horodatage du début de l'historique"""
+        with self._connexion() as conn:
+            return conn.execute("SELECT MIN(date) FROM instantanes").fetchone()[0]
+
+    def evenements(self, depuis=None, statut=None):
+        """Journal des changements, éventuellement à partir d'un horodatage ; statut : seulement les
+        entrées dans ce statut et les sorties (ex. : temps passé en Non Conforme)"""
+        filtre = "" if statut is None else "AND (nouveau = ? OR ancien = ?)"
+        with self._connexion() as conn:
+            lignes = conn.execute(
+                f"SELECT date, tache, villa, ancien, nouveau FROM historique_statuts WHERE date >= ? {filtre} ORDER BY id",
+                (depuis or 0,) + (() if statut is None else (statut, statut))
+            ).fetchall()
+        evenements = pd.DataFrame(lignes, columns=['date', 'tache', 'villa', 'ancien', 'nouveau'])
+        # Heure locale naïve, comme le sélecteur de date et datetime.now()
+        evenements['date'] = (pd.to_datetime(evenements['date'], unit='s', utc=True)
+                              .dt.tz_convert(tzlocal()).dt.tz_localize(None))
+        return evenements
+
+    def changements_par_semaine(self, depuis, nb_semaines, statuts):
+        """Passages à chacun de ces statuts, par semaine à partir de l'horodatage donné (agrégés par SQLite)"""
+        with self._connexion() as conn:
+            lignes = conn.execute(
+                "SELECT CAST((date - ?) / 604800 AS INTEGER), nouveau, COUNT(*) FROM historique_statuts "
+                f"WHERE date >= ? AND nouveau IN ({', '.join('?' * len(statuts))}) GROUP BY 1, 2",
+                (depuis, depuis, *statuts)
+            ).fetchall()
+        comptes = pd.DataFrame(lignes, columns=['semaine', 'statut', 'nombre'])
+        comptes = comptes.pivot(index='semaine', columns='statut', values='nombre')
+        return comptes.reindex(index=range(nb_semaines), columns=statuts, fill_value=0).fillna(0).astype(int)
+
+    def sauvegarder(self, codes):
+        with self._connexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            actuel = matrice_depuis_lignes(conn.execute("SELECT tache, villa, statut FROM statuts").fetchall())
+            # Cases modifiées repérées en une comparaison des matrices de codes : seules elles sont écrites
+            lignes, colonnes = np.nonzero(actuel != codes)
+            changements = [
+                (LISTE_TACHES[i], LISTE_VILLAS[j], STATUTS[actuel[i, j]], STATUTS[codes[i, j]])
+                for i, j in zip(lignes, colonnes)
+            ]
+            # Table à jour avant le journal : un instantané pris par _journaliser doit inclure ce lot
+            conn.executemany(
+                "INSERT OR REPLACE INTO statuts VALUES (?, ?, ?)",
+                [(tache, villa, nouveau) for tache, villa, _, nouveau in changements]
+            )
+            self._journaliser(conn, changements)
+            conn.execute("UPDATE meta SET valeur = valeur + 1 WHERE cle = 'version'")
+            signature = conn.execute("SELECT valeur FROM meta WHERE cle = 'version'").fetchone()[0]
+            conn.execute("COMMIT")
+        return signature
+
+    def ecrire_statuts(self, changements):
+        """Upsert d'un lot de cases [(tâche, villa, statut)] en une transaction, retourne (signature avant, après)"""
+        with self._connexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            avant = conn.execute("SELECT valeur FROM meta WHERE cle = 'version'").fetchone()[0]
+            anciens = {}
+            for tache in {tache for tache, _, _ in changements}:
+                anciens.update(
+                    ((tache, villa), statut) for villa, statut in
+                    conn.execute("SELECT villa, statut FROM statuts WHERE tache = ?", (tache,))
+                )
+            conn.executemany(
+                "INSERT INTO statuts VALUES (?, ?, ?) "
+                "ON CONFLICT (tache, villa) DO UPDATE SET statut = excluded.statut",
+                changements
+            )
+            self._journaliser(conn, [
+                (tache, villa, anciens.get((tache, villa), "À faire"), statut)
+                for tache, villa, statut in changements
+                if anciens.get((tache, villa), "À faire") != statut
+            ])
+            conn.execute("UPDATE meta SET valeur = ? WHERE cle = 'version'", (avant + 1,))
+            conn.execute("COMMIT")
+        return avant, avant + 1
+
+def creer_stockage():
+    if BACKEND_STOCKAGE == "csv":
+        return StockageCSV(FICHIER_DONNEES)
+    if BACKEND_STOCKAGE == "sqlite":
+        return StockageSQLite(FICHIER_BASE, csv_a_migrer=FICHIER_DONNEES)
+    raise ValueError(f"NORIA_STOCKAGE inconnu : {BACKEND_STOCKAGE!r} (attendu 'sqlite' ou 'csv')")
+
+class CacheStatuts:
+    """Garde la matrice des codes de statut en mémoire tant que le stockage ne change pas.
+    La matrice servie est en lecture seule : une écriture en installe une nouvelle"""
+
+    def __init__(self, stockage):
+        self.stockage = stockage
+        self._verrou = threading.Lock()
+        self._codes = None
+        self._signature = None
+        self.hits = 0
+        self.misses = 0
+
+    def obtenir(self):
+        """Retourne la matrice en cache, relue seulement si la signature du stockage a changé"""
+        with self._verrou:
+            debut = time.perf_counter()
+            signature = self.stockage.signature()
+            if self._codes is not None and signature is not None and signature == self._signature:
+                self.hits += 1
+                metriques.noter_stockage(time.perf_counter() - debut)
+                return self._codes
+            self.misses += 1
+            codes, self._signature = self.stockage.charger()
+            codes.setflags(write=False)
+            self._codes = codes
+            metriques.noter_stockage(time.perf_counter() - debut)
+            return self._codes
+
+    def enregistrer(self, codes):
+        """Écrit toute la matrice et met le cache à jour sans relecture"""
+        with self._verrou:
+            codes = np.array(codes, dtype=np.uint8)
+            self._signature = self.stockage.sauvegarder(codes)
+            codes.setflags(write=False)
+            self._codes = codes
+
+    def enregistrer_statuts(self, changements):
+        """Écrit un lot de cases en une écriture ; le cache est corrigé sur place s'il était à jour"""
+        with self._verrou:
+            avant, apres = self.stockage.ecrire_statuts(changements)
+            if self._codes is not None and self._signature == avant:
+                codes = self._codes.copy()
+                for tache, villa, statut in changements:
+                    codes[INDEX_TACHES[tache], INDEX_VILLAS[villa]] = CODES_STATUTS[statut]
+                codes.setflags(write=False)
+                self._codes = codes
+                self._signature = apres
+            else:
+                # Un autre worker a écrit entre-temps : on relira au prochain accès
+                self._codes = None
+                self._signature = None
+
+    def statistiques(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'taux_hits': self.hits / total if total else 0.0
+        }
+
+cache_statuts = CacheStatuts(creer_stockage())
+
+def matrice_statuts():
+    """Matrice des codes de statut (tâches x villas, lecture seule), servie depuis le cache"""
+    return cache_statuts.obtenir()
+
 def charger_donnees():
-    if os.path.exists(FICHIER_DONNEES):
-        df = pd.read_csv(FICHIER_DONNEES, index_col=0)
-    else:
-        df = pd.DataFrame(index=LISTE_TACHES, columns=LISTE_VILLAS)
-        df = df.fillna("À faire")
-        df.to_csv(FICHIER_DONNEES)
-    return df
+    """Retourne le tableau des statuts en chaînes (décodé depuis la matrice en cache)"""
+    return tableau_statuts(cache_statuts.obtenir())
+
+def statut_case(tache, villa):
+    """Statut d'une seule case, lu dans le cache sans copier la matrice"""
+    return STATUTS[cache_statuts.obtenir()[INDEX_TACHES[tache], INDEX_VILLAS[villa]]]
 
 def sauvegarder_donnees(df):
-    df.to_csv(FICHIER_DONNEES)
+    """Écrit tout un tableau de statuts en chaînes (tâches x villas)"""
+    cache_statuts.enregistrer(coder_statuts(df.reindex(index=LISTE_TACHES, columns=LISTE_VILLAS).to_numpy()))
+
+def sauvegarder_statut(tache, villa, statut):
+    """Modifie une seule case du tableau (sans réécrire tout le fichier)"""
+    cache_statuts.enregistrer_statuts([(tache, villa, statut)])
+
+def sauvegarder_statuts(changements):
+    """Modifie un lot de cases [(tâche, villa, statut)] en une seule écriture"""
+    cache_statuts.enregistrer_statuts(changements)
+
+@lru_cache(maxsize=16)
+def _statuts_jour_passe(jour):
+    # Un jour révolu ne change plus : reconstruction gardée en mémoire
+    fin = datetime.fromisoformat(jour) + timedelta(days=1)
+    codes = cache_statuts.stockage.statuts_a_la_date(fin.timestamp())
+    if codes is not None:
+        codes.setflags(write=False)
+    return codes
+
+def statuts_a_la_date(jour):
+    """Matrice des statuts à la fin du jour 'AAAA-MM-JJ' (None si l'historique ne remonte pas si loin)"""
+    if jour >= datetime.now().date().isoformat():
+        return cache_statuts.obtenir()
+    return _statuts_jour_passe(jour)
 
 def get_types_docs_pour_tache(tache):
     """Retourne les types de documents possibles pour une tâche"""
-    if "Réception des axes" in tache:
-        return {
-            "Autocontrole_Archi": "📂 Autocontrôle Archi",
-            "PV_Archi": "📄 PV Archi", 
-            "Scan_Topo": "📐 Scan Topo"
-        }
-    elif "fond de fouille" in tache:
-        return {"Document_Unique": "📄 Document Unique"}
-    elif "semelles" in tache:
-        return {
-            "Autocontrole": "📂 Autocontrôle",
-            "PV_Reception": "📄 PV Réception"
-        }
-    elif "béton" in tache:
-        return {
-            "Rapport_Labo": "🔬 Rapport Labo",
-            "PV_Reception": "📄 PV Réception"
-        }
-    else:
-        return {"Document": "📄 Document"}
+    return TYPES_DOCS.get(tache, DOCS_PAR_DEFAUT)
+
+class DepotDocuments:
+    """PDF rangés par contenu : chaque fichier est stocké une seule fois sous son empreinte SHA-256
+    (objets/ab/abcd….pdf). Une petite table SQLite associe (tâche, villa, type_doc) à l'empreinte
+    courante et garde l'historique des versions : remplacer un document ne détruit plus l'ancien"""
+
+    def __init__(self, dossier):
+        self.dossier_objets = os.path.join(os.path.abspath(dossier), "objets")
+        # La base est dans objets/ : ses fichiers -wal/-shm ne modifient pas le mtime du dossier principal
+        self.chemin = os.path.join(self.dossier_objets, "documents.db")
+        os.makedirs(self.dossier_objets, exist_ok=True)
+        with self._connexion() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    tache TEXT NOT NULL,
+                    villa TEXT NOT NULL,
+                    type_doc TEXT NOT NULL,
+                    empreinte TEXT NOT NULL,
+                    PRIMARY KEY (tache, villa, type_doc)
+                ) WITHOUT ROWID
+            """)
+            # empreinte NULL : document supprimé
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS versions_documents (
+                    id INTEGER PRIMARY KEY,
+                    tache TEXT NOT NULL,
+                    villa TEXT NOT NULL,
+                    type_doc TEXT NOT NULL,
+                    empreinte TEXT,
+                    taille INTEGER,
+                    date TEXT NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS versions_par_document "
+                "ON versions_documents (tache, villa, type_doc, empreinte)"
+            )
+            # Taille et CRC-32 de chaque contenu : de quoi décrire un export ZIP sans relire les fichiers
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS objets (
+                    empreinte TEXT PRIMARY KEY,
+                    taille INTEGER NOT NULL,
+                    crc32 INTEGER NOT NULL
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (cle TEXT PRIMARY KEY, valeur INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('version', 0)")
+            
+            self.recherche_disponible = fts5_disponible()
+            if self.recherche_disponible:
+                self._creer_recherche(conn)
+
+    def _creer_recherche(self, conn):
+        """Index plein texte : le texte une fois par contenu, tâche/villa/type dans un petit index à part"""
+        conn.execute("BEGIN IMMEDIATE")
+        existantes = {nom for nom, in conn.execute("SELECT name FROM sqlite_master")}
+        # Texte extrait de chaque contenu ('' : PDF sans texte ou illisible)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS textes_contenus (
+                id INTEGER PRIMARY KEY,
+                empreinte TEXT NOT NULL UNIQUE,
+                texte TEXT NOT NULL
+            )
+        """)
+        # Index externe sur textes_contenus : le texte n'est pas recopié dans l'index.
+        # Accents ignorés, préfixes de 2-3 lettres pré-indexés
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS recherche_texte USING fts5(
+                texte, content = 'textes_contenus', content_rowid = 'id',
+                tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS documents_par_empreinte ON documents (empreinte)")
+        # Une ligne par document courant, rowid = id de sa version
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS recherche_documents USING fts5(
+                tache, villa, type_doc, empreinte UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+            )
+        """)
+        if "textes" in existantes:
+            # Ancien index (texte recopié pour chaque document) : le texte est repris, l'index reconstruit
+            conn.execute("INSERT OR IGNORE INTO textes_contenus (empreinte, texte) SELECT empreinte, texte FROM textes")
+            conn.execute("INSERT INTO recherche_texte (recherche_texte) VALUES ('rebuild')")
+            conn.execute("DROP TABLE IF EXISTS recherche")
+            conn.execute("DROP TABLE textes")
+        if "recherche_documents" not in existantes:
+            conn.execute("""
+                INSERT INTO recherche_documents (rowid, tache, villa, type_doc, empreinte)
+                SELECT MAX(v.id), d.tache, d.villa, d.type_doc, d.empreinte FROM documents d
+                JOIN versions_documents v ON v.tache = d.tache AND v.villa = d.villa AND v.type_doc = d.type_doc
+                GROUP BY d.tache, d.villa, d.type_doc
+            """)
+        conn.execute("COMMIT")
+
+    def _connexion(self):
+        return ouvrir_sqlite(self.chemin)
+
+    def chemin_objet(self, empreinte):
+        return os.path.join(self.dossier_objets, empreinte[:2], f"{empreinte}.pdf")
+
+    def stocker(self, flux):
+        """Recopie le flux bloc par bloc en calculant son SHA-256, retourne (empreinte, taille).
+        Un contenu déjà présent n'est pas écrit une seconde fois"""
+        empreinte = hashlib.sha256()
+        crc = 0
+        taille = 0
+        # Fichier temporaire sur le même disque pour que os.replace soit atomique :
+        # un lecteur ne voit jamais d'objet partiel
+        fd, chemin_tmp = tempfile.mkstemp(dir=self.dossier_objets, prefix=".upload-", suffix=".part")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for bloc in iter(lambda: flux.read(TAILLE_BLOC), b""):
+                    empreinte.update(bloc)
+                    crc = zlib.crc32(bloc, crc)
+                    f.write(bloc)
+                    taille += len(bloc)
+            empreinte = empreinte.hexdigest()
+            chemin = self.chemin_objet(empreinte)
+            if os.path.exists(chemin):
+                os.remove(chemin_tmp)
+            else:
+                os.makedirs(os.path.dirname(chemin), exist_ok=True)
+                os.replace(chemin_tmp, chemin)
+        except BaseException:
+            if os.path.exists(chemin_tmp):
+                os.remove(chemin_tmp)
+            raise
+        with self._connexion() as conn:
+            conn.execute("INSERT OR IGNORE INTO objets VALUES (?, ?, ?)", (empreinte, taille, crc))
+        return empreinte, taille
+
+    def relire(self, empreinte):
+        """(SHA-256, taille, CRC-32) recalculés depuis le contenu stocké ; FileNotFoundError s'il a disparu"""
+        sha, crc, taille = hashlib.sha256(), 0, 0
+        with open(self.chemin_objet(empreinte), 'rb') as f:
+            for bloc in iter(lambda: f.read(TAILLE_BLOC), b""):
+                sha.update(bloc)
+                crc = zlib.crc32(bloc, crc)
+                taille += len(bloc)
+        return sha.hexdigest(), taille, crc
+
+    def infos_objets(self, empreintes):
+        """{empreinte: (taille, crc32)} ; calculés (une fois) en relisant les contenus stockés avant leur suivi"""
+        with self._connexion() as conn:
+            infos = {empreinte: (taille, crc) for empreinte, taille, crc in conn.execute("SELECT * FROM objets")}
+        manquants = []
+        for empreinte in set(empreintes) - set(infos):
+            crc, taille = 0, 0
+            try:
+                with open(self.chemin_objet(empreinte), 'rb') as f:
+                    for bloc in iter(lambda: f.read(TAILLE_BLOC), b""):
+                        crc = zlib.crc32(bloc, crc)
+                        taille += len(bloc)
+            except FileNotFoundError:
+                continue
+            infos[empreinte] = (taille, crc)
+            manquants.append((empreinte, taille, crc))
+        if manquants:
+            with self._connexion() as conn:
+                conn.executemany("INSERT OR IGNORE INTO objets VALUES (?, ?, ?)", manquants)
+        return infos
+
+    def signature(self):
+        with self._connexion() as conn:
+            return conn.execute("SELECT valeur FROM meta WHERE cle = 'version'").fetchone()[0]
+
+    def charger(self):
+        """Retourne ({(tâche, villa, type_doc): empreinte}, signature) lus dans la même transaction"""
+        with self._connexion() as conn:
+            conn.execute("BEGIN")
+            signature = conn.execute("SELECT valeur FROM meta WHERE cle = 'version'").fetchone()[0]
+            lignes = conn.execute("SELECT tache, villa, type_doc, empreinte FROM documents").fetchall()
+            conn.execute("COMMIT")
+        return {(tache, villa, type_doc): empreinte for tache, villa, type_doc, empreinte in lignes}, signature
+
+    def associer(self, documents):
+        """Enregistre [(tâche, villa, type_doc, empreinte, taille)] en une transaction (empreinte None :
+        suppression) et retourne (signature avant, après)"""
+        date = datetime.now().isoformat(timespec='seconds')
+        with self._connexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            avant = conn.execute("SELECT valeur FROM meta WHERE cle = 'version'").fetchone()[0]
+            conn.executemany(
+                "DELETE FROM documents WHERE tache = ? AND villa = ? AND type_doc = ?",
+                [(tache, villa, type_doc) for tache, villa, type_doc, empreinte, _ in documents if empreinte is None]
+            )
+            conn.executemany(
+                "INSERT INTO documents VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (tache, villa, type_doc) DO UPDATE SET empreinte = excluded.empreinte",
+                [(tache, villa, type_doc, empreinte) for tache, villa, type_doc, empreinte, _ in documents if empreinte]
+            )
+            for document in documents:
+                if self.recherche_disponible:
+                    # La ligne de recherche suit la version courante du document
+                    conn.execute("DELETE FROM recherche_documents WHERE rowid = (SELECT MAX(id) FROM versions_documents "
+                                 "WHERE tache = ? AND villa = ? AND type_doc = ?)", document[:3])
+                version = conn.execute(
+                    "INSERT INTO versions_documents (tache, villa, type_doc, empreinte, taille, date) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    document + (date,)
+                ).lastrowid
+                if self.recherche_disponible and document[3]:
+                    conn.execute(
+                        "INSERT INTO recherche_documents (rowid, tache, villa, type_doc, empreinte) VALUES (?, ?, ?, ?, ?)",
+                        (version,) + document[:4]
+                    )
+            conn.execute("UPDATE meta SET valeur = ? WHERE cle = 'version'", (avant + 1,))
+            conn.execute("COMMIT")
+        return avant, avant + 1
+
+    def enregistrer_texte(self, empreinte, texte):
+        """Mémorise et indexe le texte d'un contenu, une seule fois quel que soit le nombre de documents
+        qui l'utilisent (le texte d'un contenu ne change jamais)"""
+        with self._connexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            curseur = conn.execute(
+                "INSERT INTO textes_contenus (empreinte, texte) VALUES (?, ?) ON CONFLICT (empreinte) DO NOTHING",
+                (empreinte, texte)
+            )
+            if curseur.rowcount:
+                conn.execute("INSERT INTO recherche_texte (rowid, texte) VALUES (?, ?)", (curseur.lastrowid, texte))
+            conn.execute("COMMIT")
+
+    def empreintes_sans_texte(self):
+        """Contenus des documents courants dont le texte n'a pas encore été extrait"""
+        with self._connexion() as conn:
+            return [empreinte for empreinte, in conn.execute(
+                "SELECT DISTINCT empreinte FROM documents WHERE empreinte NOT IN (SELECT empreinte FROM textes_contenus)"
+            )]
+
+    def texte_connu(self, empreinte):
+        with self._connexion() as conn:
+            return conn.execute("SELECT 1 FROM textes_contenus WHERE empreinte = ?", (empreinte,)).fetchone() is not None
+
+    def rechercher(self, termes, limite):
+        """[(tâche, villa, type_doc, empreinte, extrait)] des documents courants dont chaque terme FTS5 se
+        trouve dans le texte ou dans la tâche/villa/type, les plus pertinents d'abord ; les mots
+        trouvés sont entourés de \x02 … \x03 dans l'extrait"""
+        # Un terme peut être dans le texte (index par contenu) ou dans les métadonnées (index par document)
+        condition = (
+            "(p.id IN (SELECT rowid FROM recherche_texte WHERE recherche_texte MATCH ?) "
+            "OR (d.tache, d.villa, d.type_doc) IN "
+            "(SELECT tache, villa, type_doc FROM recherche_documents WHERE recherche_documents MATCH ?))"
+        )
+        n_importe_lequel = " OR ".join(termes)
+        with self._connexion() as conn:
+            conn.execute("BEGIN")
+            # Documents dont le texte contient au moins un terme, classés par pertinence du texte.
+            # CROSS JOIN fixe l'ordre : on part des contenus trouvés, jamais de toute la table documents
+            lignes = conn.execute(f"""
+                WITH pertinence (id, rang) AS MATERIALIZED (
+                    SELECT rowid, rank FROM recherche_texte WHERE recherche_texte MATCH ?
+                )
+                SELECT d.tache, d.villa, d.type_doc, d.empreinte, p.id FROM pertinence p
+                CROSS JOIN textes_contenus t ON t.id = p.id
+                CROSS JOIN documents d ON d.empreinte = t.empreinte
+                WHERE {" AND ".join([condition] * len(termes))}
+                ORDER BY p.rang, d.tache, d.villa, d.type_doc LIMIT ?
+            """, [n_importe_lequel] + [terme for terme in termes for _ in range(2)] + [limite]).fetchall()
+            if len(lignes) < limite:
+                # Puis ceux dont seuls la tâche, la villa ou le type contiennent tous les termes
+                lignes += conn.execute("""
+                    SELECT r.tache, r.villa, r.type_doc, r.empreinte, t.id FROM recherche_documents r
+                    LEFT JOIN textes_contenus t ON t.empreinte = r.empreinte
+                    WHERE recherche_documents MATCH ? AND (t.id IS NULL OR t.id NOT IN
+                        (SELECT rowid FROM recherche_texte WHERE recherche_texte MATCH ?))
+                    ORDER BY r.tache, r.villa, r.type_doc LIMIT ?
+                """, (" AND ".join(termes), n_importe_lequel, limite - len(lignes))).fetchall()
+            # Extraits calculés seulement pour les contenus affichés
+            ids = sorted({id_texte for *_, id_texte in lignes if id_texte is not None})
+            extraits = dict(conn.execute(
+                "SELECT rowid, snippet(recherche_texte, 0, char(2), char(3), '…', 24) FROM recherche_texte "
+                f"WHERE recherche_texte MATCH ? AND rowid IN ({', '.join('?' * len(ids))})",
+                [n_importe_lequel] + ids
+            )) if ids else {}
+            # Terme trouvé seulement dans la tâche/villa/type : début du texte, comme le ferait snippet()
+            sans_extrait = [id_texte for id_texte in ids if id_texte not in extraits]
+            for id_texte, debut in conn.execute(
+                f"SELECT id, substr(texte, 1, 400) FROM textes_contenus WHERE id IN ({', '.join('?' * len(sans_extrait))})",
+                sans_extrait
+            ) if sans_extrait else ():
+                mots = debut.split()
+                extraits[id_texte] = " ".join(mots[:24]) + ("…" if len(mots) > 24 else "")
+            conn.execute("COMMIT")
+        return [(tache, villa, type_doc, empreinte, extraits.get(id_texte, ""))
+                for tache, villa, type_doc, empreinte, id_texte in lignes]
+
+    def couverture_texte(self):
+        """(documents courants dont le texte est indexé, documents courants)"""
+        with self._connexion() as conn:
+            return conn.execute(
+                "SELECT COUNT(t.empreinte), COUNT(*) FROM documents d LEFT JOIN textes_contenus t ON t.empreinte = d.empreinte"
+            ).fetchone()
+
+    def version_existe(self, tache, villa, type_doc, empreinte):
+        """Vrai si ce contenu a été, à un moment, le document de cette tâche/villa/type"""
+        with self._connexion() as conn:
+            return conn.execute(
+                "SELECT 1 FROM versions_documents WHERE tache = ? AND villa = ? AND type_doc = ? AND empreinte = ?",
+                (tache, villa, type_doc, empreinte)
+            ).fetchone() is not None
 
-def sauvegarder_fichier(content, filename, tache, villa, type_doc):
-    """Sauvegarde un fichier uploadé"""
-    content_type, content_string = content.split(',')
-    decoded = base64.b64decode(content_string)
+depot_documents = DepotDocuments(DOSSIER_FICHIERS)
+
+class IndexDocuments:
+    """Index en mémoire de la table des documents, clé (tâche, villa, type_doc) -> empreinte,
+    relu seulement quand la version de la table change"""
+
+    def __init__(self, depot):
+        self.depot = depot
+        self._verrou = threading.Lock()
+        self._cles_par_nom = None
+        self._empreintes = {}
+        self._signature = None
+
+    def _cles_attendues(self):
+        # Nom de fichier -> (tâche, villa, type_doc), calculé une seule fois
+        if self._cles_par_nom is None:
+            self._cles_par_nom = {
+                nom_fichier_document(tache, villa, type_doc): (tache, villa, type_doc)
+                for tache in LISTE_TACHES
+                for type_doc in get_types_docs_pour_tache(tache)
+                for villa in LISTE_VILLAS
+            }
+        return self._cles_par_nom
+
+    def cle_pour_nom(self, nom):
+        """(tâche, villa, type_doc) correspondant à un nom de document, ou None"""
+        return self._cles_attendues().get(nom)
+
+    def _rafraichir(self):
+        signature = self.depot.signature()
+        if signature != self._signature:
+            logger.debug("Relecture de la table des documents")
+            self._empreintes, self._signature = self.depot.charger()
+
+    def empreinte(self, tache, villa, type_doc):
+        with self._verrou:
+            self._rafraichir()
+            return self._empreintes.get((tache, villa, type_doc))
+
+    def fichiers(self, tache, villa):
+        """Retourne {type_doc: empreinte} des documents présents pour une tâche/villa"""
+        with self._verrou:
+            self._rafraichir()
+            return {
+                type_doc: self._empreintes[(tache, villa, type_doc)]
+                for type_doc in get_types_docs_pour_tache(tache)
+                if (tache, villa, type_doc) in self._empreintes
+            }
+
+    def presence(self):
+        """Copie de tout l'index {(tâche, villa, type_doc): empreinte} pour les requêtes sur la grille"""
+        with self._verrou:
+            self._rafraichir()
+            return dict(self._empreintes)
+
+    def signature(self):
+        """Version de la table des documents"""
+        with self._verrou:
+            self._rafraichir()
+            return self._signature
+
+    def villas_sans_document(self, tache, type_doc):
+        """Ex. : quelles villas n'ont pas encore de PV pour cette tâche"""
+        with self._verrou:
+            self._rafraichir()
+            return [villa for villa in LISTE_VILLAS if (tache, villa, type_doc) not in self._empreintes]
+
+    def enregistrer(self, documents):
+        """Écrit [(tâche, villa, type_doc, empreinte, taille)] ; l'index est corrigé sur place s'il était à jour"""
+        with self._verrou:
+            avant, apres = self.depot.associer(documents)
+            if self._signature == avant:
+                for tache, villa, type_doc, empreinte, _ in documents:
+                    if empreinte:
+                        self._empreintes[(tache, villa, type_doc)] = empreinte
+                    else:
+                        self._empreintes.pop((tache, villa, type_doc), None)
+                self._signature = apres
+            else:
+                # Un autre worker a écrit entre-temps : on relira au prochain accès
+                self._signature = None
+
+index_documents = IndexDocuments(depot_documents)
+
+def pool_processus(travailleurs):
+    """Pool de processus démarrés en "spawn" : un fork copierait les verrous tenus par les
+    threads du serveur (journalisation, SQLite) et pourrait bloquer le fils"""
+    return ProcessPoolExecutor(max_workers=travailleurs, mp_context=multiprocessing.get_context("spawn"))
+
+class Apercus:
+    """Aperçus de la première page des PDF, rangés par empreinte du contenu (un document remplacé
+    a donc un nouvel aperçu) et générés hors des requêtes par un pool de processus
+    (pdfium n'est pas thread-safe)"""
     
-    # Nettoyer le nom - toujours utiliser .pdf
-    nom_propre = f"{tache}_{villa}_{type_doc}".replace(" ", "_").replace(".", "").replace(",", "")
-    nom_final = f"{nom_propre}.pdf"
+    def __init__(self, dossier, travailleurs):
+        self.dossier = os.path.abspath(dossier)
+        self.travailleurs = travailleurs
+        self._verrou = threading.Lock()
+        self._pool = None
+        self._prets = set()
+        self._en_cours = set()
+        self._echecs = set()
     
-    # Utiliser le chemin absolu pour éviter les problèmes
-    chemin_complet = os.path.abspath(os.path.join(DOSSIER_FICHIERS, nom_final))
+    def chemin(self, empreinte):
+        return os.path.join(self.dossier, f"{empreinte}.jpg")
     
-    # Créer le dossier s'il n'existe pas
-    os.makedirs(os.path.dirname(chemin_complet), exist_ok=True)
+    def planifier(self, empreinte, chemin_pdf):
+        """Demande l'aperçu de ce contenu, sans attendre"""
+        if pdfium is None:
+            return
+        with self._verrou:
+            if empreinte in self._prets or empreinte in self._en_cours or empreinte in self._echecs:
+                return
+            # Pool créé au premier besoin : pas de processus fils pour un worker qui n'affiche aucun aperçu
+            if self._pool is None:
+                self._pool = pool_processus(self.travailleurs)
+            pool = self._pool
+            try:
+                travail = pool.submit(traitements_pdf.generer_apercu, chemin_pdf, self.chemin(empreinte), LARGEUR_APERCU)
+            except (BrokenExecutor, RuntimeError) as erreur:
+                # Pool cassé (fils tué) ou arrêté : recréé à la prochaine demande
+                logger.warning("Aperçu impossible pour %s : %s", empreinte, erreur)
+                self._pool = None
+                self._echecs.add(empreinte)
+                return
+            self._en_cours.add(empreinte)
+        travail.add_done_callback(lambda t: self._termine(empreinte, t, pool))
     
-    with open(chemin_complet, 'wb') as f:
-        f.write(decoded)
+    def _termine(self, empreinte, travail, pool):
+        try:
+            travail.result()
+        except Exception as erreur:
+            logger.warning("Aperçu impossible pour %s : %s", empreinte, erreur)
+            with self._verrou:
+                if isinstance(erreur, BrokenExecutor) and self._pool is pool:
+                    self._pool = None
+                self._en_cours.discard(empreinte)
+                # Pas de nouvel essai pour ce contenu
+                self._echecs.add(empreinte)
+            return
+        with self._verrou:
+            self._en_cours.discard(empreinte)
+            self._prets.add(empreinte)
+        logger.debug("Aperçu prêt: %s", empreinte)
     
-    print(f"✅ Fichier sauvegardé: {chemin_complet}")  # Debug
+    def arreter(self):
+        """Attend la fin des aperçus demandés et arrête le pool (commandes hors serveur)"""
+        with self._verrou:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def etat(self, empreinte, chemin_pdf):
+        """True si l'aperçu est prêt ; sinon None (génération demandée) ou False (PDF illisible)"""
+        if pdfium is None:
+            return False
+        with self._verrou:
+            if empreinte in self._prets:
+                return True
+            if empreinte in self._echecs:
+                return False
+        # Généré par un autre worker ou avant un redémarrage
+        metriques.noter_fs()
+        if os.path.exists(self.chemin(empreinte)):
+            with self._verrou:
+                self._prets.add(empreinte)
+            return True
+        self.planifier(empreinte, chemin_pdf)
+        return None
+
+apercus = Apercus(DOSSIER_APERCUS, TRAVAILLEURS_APERCU)
+
+def enregistrer_documents(documents):
+    """Associe [(tâche, villa, type_doc, empreinte, taille)] déjà stockés en une écriture, puis demande
+    l'aperçu et le texte des contenus en arrière-plan"""
+    index_documents.enregistrer(documents)
+    empreintes = list(dict.fromkeys(empreinte for _, _, _, empreinte, _ in documents))
+    for empreinte in empreintes:
+        apercus.planifier(empreinte, depot_documents.chemin_objet(empreinte))
+    index_texte.planifier(empreintes)
+
+def sauvegarder_fichier(flux, tache, villa, type_doc):
+    """Range un fichier uploadé dans le dépôt (recopié bloc par bloc, haché au passage) et l'associe à la tâche/villa/type"""
+    nom_final = nom_fichier_document(tache, villa, type_doc)
+    empreinte, taille = depot_documents.stocker(flux)
+    enregistrer_documents([(tache, villa, type_doc, empreinte, taille)])
+    metriques.noter_fs(2)
+    
+    logger.debug("Fichier sauvegardé: %s (%s)", nom_final, empreinte)
     return nom_final
 
-def fichier_existe(tache, villa, type_doc):
-    """Vérifie si un fichier existe pour cette tâche/villa/type"""
-    nom_base = f"{tache}_{villa}_{type_doc}".replace(" ", "_").replace(".", "").replace(",", "")
-    chemin = os.path.abspath(os.path.join(DOSSIER_FICHIERS, f"{nom_base}.pdf"))
-    if os.path.exists(chemin):
-        print(f"✅ Fichier trouvé: {chemin}")  # Debug
-        return chemin
-    else:
-        print(f"❌ Fichier non trouvé: {chemin}")  # Debug
+# Forme courte acceptée pour les imports groupés : T1_V12_PV_Archi.pdf
+MOTIF_NOM_COURT = re.compile(r"^T(\d+)[ _-]*V(?:illa)?[ _-]*(\d+)[ _-]+(.+)$", re.IGNORECASE)
+
+def identifier_document(nom_fichier):
+    """Retrouve (tâche, villa, type_doc) d'après le nom d'un fichier, ou None"""
+    base, extension = os.path.splitext(os.path.basename(nom_fichier))
+    if extension.lower() != ".pdf":
+        return None
+    
+    # Nom déjà donné par l'application (ex. téléchargé puis renvoyé)
+    cle = index_documents.cle_pour_nom(f"{base}.pdf")
+    if cle:
+        return cle
+    
+    correspondance = MOTIF_NOM_COURT.match(base)
+    if not correspondance:
+        return None
+    num_tache, num_villa = int(correspondance[1]), int(correspondance[2])
+    if not (1 <= num_tache <= len(LISTE_TACHES) and 1 <= num_villa <= len(LISTE_VILLAS)):
+        return None
+    tache = LISTE_TACHES[num_tache - 1]
+    type_saisi = re.sub(r"[ -]", "_", correspondance[3]).lower()
+    for type_doc in get_types_docs_pour_tache(tache):
+        if type_doc.lower() == type_saisi:
+            return tache, LISTE_VILLAS[num_villa - 1], type_doc
     return None
 
 def supprimer_fichier(tache, villa, type_doc):
-    """Supprime un fichier"""
-    chemin = fichier_existe(tache, villa, type_doc)
-    if chemin and os.path.exists(chemin):
-        os.remove(chemin)
-        return True
-    return False
+    """Retire le document ; son contenu reste dans le dépôt avec l'historique des versions"""
+    if index_documents.empreinte(tache, villa, type_doc) is None:
+        return False
+    index_documents.enregistrer([(tache, villa, type_doc, None, None)])
+    return True
 
 def get_tous_les_fichiers(tache, villa):
     """Récupère tous les fichiers existants pour une tâche/villa"""
     fichiers = {}
     types_possibles = get_types_docs_pour_tache(tache)
-    for type_doc, label in types_possibles.items():
-        chemin = fichier_existe(tache, villa, type_doc)
-        if chemin:
-            fichiers[type_doc] = {
-                'chemin': chemin,
-                'nom': os.path.basename(chemin),
-                'extension': 'pdf',
-                'label': label
-            }
+    for type_doc, empreinte in index_documents.fichiers(tache, villa).items():
+        chemin = depot_documents.chemin_objet(empreinte)
+        fichiers[type_doc] = {
+            'chemin': chemin,
+            'nom': nom_fichier_document(tache, villa, type_doc),
+            'extension': 'pdf',
+            'label': types_possibles[type_doc],
+            'version': empreinte,
+            'apercu': apercus.etat(empreinte, chemin)
+        }
     return fichiers
 
+class FileTravaux:
+    """Travaux longs exécutés hors des requêtes. La file est une table SQLite partagée par tous
+    les workers : la requête enregistre le travail et répond aussitôt, des fils d'exécution le
+    réclament et publient sa progression, que le navigateur suit sur /travaux/<id>"""
+
+    def __init__(self, chemin, travailleurs):
+        self.chemin = chemin
+        self.travailleurs = travailleurs
+        self._gestionnaires = {}
+        self._reveil = threading.Event()
+        self._verrou = threading.Lock()
+        self._pid = None
+        with self._connexion() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            # etat : en_attente, en_cours, termine ou erreur ; parametres et resultat en JSON
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS travaux (
+                    id INTEGER PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    parametres TEXT NOT NULL,
+                    etat TEXT NOT NULL DEFAULT 'en_attente',
+                    progression REAL NOT NULL DEFAULT 0,
+                    message TEXT NOT NULL DEFAULT '',
+                    resultat TEXT,
+                    cree REAL NOT NULL,
+                    maj REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS travaux_par_etat ON travaux (etat, maj)")
+
+    def _connexion(self):
+        return ouvrir_sqlite(self.chemin)
+
+    def gestionnaire(self, type_travail):
+        """Décorateur : fonction(parametres, avancer) exécutée pour ce type de travail, qui retourne son résultat"""
+        def enregistrer(fonction):
+            self._gestionnaires[type_travail] = fonction
+            return fonction
+        return enregistrer
+
+    def soumettre(self, type_travail, parametres):
+        """Met un travail en file et retourne son identifiant, sans attendre son exécution"""
+        maintenant = time.time()
+        with self._connexion() as conn:
+            travail_id = conn.execute(
+                "INSERT INTO travaux (type, parametres, cree, maj) VALUES (?, ?, ?, ?)",
+                (type_travail, json.dumps(parametres, ensure_ascii=False), maintenant, maintenant)
+            ).lastrowid
+        self._demarrer()
+        self._reveil.set()
+        return travail_id
+
+    def etat(self, travail_id):
+        """{'id', 'type', 'etat', 'progression', 'message', 'resultat'} d'un travail, ou None"""
+        # Le worker interrogé peut aussi reprendre un travail abandonné par un autre
+        self._demarrer()
+        with self._connexion() as conn:
+            ligne = conn.execute(
+                "SELECT id, type, etat, progression, message, resultat FROM travaux WHERE id = ?", (travail_id,)
+            ).fetchone()
+        if ligne is None:
+            return None
+        etat = dict(zip(('id', 'type', 'etat', 'progression', 'message', 'resultat'), ligne))
+        etat['resultat'] = json.loads(etat['resultat']) if etat['resultat'] else None
+        return etat
+
+    def _demarrer(self):
+        # Fils lancés au premier besoin dans chaque processus : jamais dans le maître gunicorn avant le fork
+        with self._verrou:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        with self._connexion() as conn:
+            conn.execute(
+                "DELETE FROM travaux WHERE etat IN ('termine', 'erreur') AND maj < ?",
+                (time.time() - CONSERVATION_TRAVAUX,)
+            )
+        for numero in range(self.travailleurs):
+            threading.Thread(target=self._boucle, name=f"noria-travaux-{numero}", daemon=True).start()
+
+    def _reclamer(self):
+        """(id, type, paramètres) du plus ancien travail disponible, réservé pour ce fil, ou None"""
+        limite = time.time() - DELAI_REPRISE_TRAVAUX
+        disponible = "(etat = 'en_attente' OR (etat = 'en_cours' AND maj < ?))"
+        with self._connexion() as conn:
+            candidats = conn.execute(
+                f"SELECT id, type, parametres FROM travaux WHERE {disponible} ORDER BY id LIMIT 5", (limite,)
+            ).fetchall()
+            for travail_id, type_travail, parametres in candidats:
+                # UPDATE conditionnel : un seul fil, tous workers confondus, obtient le travail
+                reserve = conn.execute(
+                    f"UPDATE travaux SET etat = 'en_cours', maj = ? WHERE id = ? AND {disponible}",
+                    (time.time(), travail_id, limite)
+                ).rowcount
+                if reserve:
+                    return travail_id, type_travail, json.loads(parametres)
+        return None
+
+    def _boucle(self):
+        while True:
+            try:
+                travail = self._reclamer()
+            except sqlite3.Error:
+                logger.exception("File de travaux indisponible")
+                travail = None
+            if travail is None:
+                # Réveil immédiat pour les travaux de ce worker, sondage pour ceux des autres
+                self._reveil.wait(1)
+                self._reveil.clear()
+                continue
+            self._executer(*travail)
+
+    def _executer(self, travail_id, type_travail, parametres):
+        def avancer(progression, message=""):
+            self._maj(travail_id, progression=progression, message=message)
+        
+        debut = time.perf_counter()
+        try:
+            resultat = self._gestionnaires[type_travail](parametres, avancer)
+        except Exception as erreur:
+            logger.exception("Travail %s (%s) en échec", travail_id, type_travail)
+            self._maj(travail_id, etat='erreur', message=str(erreur))
+            return
+        self._maj(travail_id, etat='termine', progression=1.0, resultat=json.dumps(resultat, ensure_ascii=False))
+        logger.info("Travail %s (%s) terminé en %.1f s", travail_id, type_travail, time.perf_counter() - debut)
+
+    def _maj(self, travail_id, **champs):
+        champs['maj'] = time.time()
+        with self._connexion() as conn:
+            conn.execute(
+                f"UPDATE travaux SET {', '.join(f'{champ} = ?' for champ in champs)} WHERE id = ?",
+                (*champs.values(), travail_id)
+            )
+
+travaux = FileTravaux(os.path.join(depot_documents.dossier_objets, "travaux.db"), TRAVAILLEURS_FOND)
+# Fichiers reçus, en attente de leur rangement dans le dépôt
+DOSSIER_ATTENTE = os.path.join(depot_documents.dossier_objets, "attente")
+os.makedirs(DOSSIER_ATTENTE, exist_ok=True)
+
+def mettre_en_attente(flux):
+    """Recopie un fichier reçu dans le dossier d'attente (bloc par bloc) et retourne son chemin"""
+    fd, chemin = tempfile.mkstemp(dir=DOSSIER_ATTENTE, suffix=".part")
+    with os.fdopen(fd, 'wb') as f:
+        shutil.copyfileobj(flux, f, TAILLE_BLOC)
+    metriques.noter_fs()
+    return chemin
+
+@travaux.gestionnaire('import')
+def travail_import(parametres, avancer):
+    """Range les fichiers reçus par /upload ou /upload-lot : hachage, dépôt, index et aperçus"""
+    fichiers = parametres['fichiers']
+    resume = {'enregistres': [], 'ignores': parametres['ignores'], 'erreurs': []}
+    
+    def ranger(fichier):
+        with open(fichier['chemin'], 'rb') as f:
+            return sauvegarder_fichier(f, *fichier['cle'])
+    
+    try:
+        with ThreadPoolExecutor(max_workers=TRAVAILLEURS_LOT) as pool:
+            ecritures = {pool.submit(ranger, fichier): fichier for fichier in fichiers}
+            for nombre, ecriture in enumerate(as_completed(ecritures), 1):
+                fichier = ecritures[ecriture]
+                tache, villa, type_doc = fichier['cle']
+                try:
+                    ecriture.result()
+                except OSError as erreur:
+                    resume['erreurs'].append({'fichier': fichier['nom'], 'raison': str(erreur)})
+                else:
+                    resume['enregistres'].append({
+                        'fichier': fichier['nom'], 'tache': tache, 'villa': villa, 'type_doc': type_doc
+                    })
+                avancer(nombre / len(fichiers), f"{nombre}/{len(fichiers)} fichier(s) rangé(s)")
+    finally:
+        for fichier in fichiers:
+            if os.path.exists(fichier['chemin']):
+                os.remove(fichier['chemin'])
+    # Version après l'import : le navigateur qui l'a lancé ne la prend pas pour celle d'un autre poste
+    resume['version'] = version_courante()
+    return resume
+
+# PDF posés à la main dans fichiers_chantier (copies manuelles, fichiers d'avant le stockage par
+# contenu) : rangés dans le dépôt sur demande, par lots, les originaux mis de côté dans importes/
+DOSSIER_IMPORTES = os.path.join(DOSSIER_FICHIERS, "importes")
+TAILLE_LOT_RANGEMENT = 50
+
+def fichiers_a_ranger():
+    """[(nom, chemin, (tâche, villa, type_doc))] des PDF déposés à la main sous leur nom canonique"""
+    metriques.noter_fs()
+    with os.scandir(DOSSIER_FICHIERS) as entrees:
+        fichiers = [(entree.name, entree.path, index_documents.cle_pour_nom(entree.name))
+                    for entree in entrees if entree.is_file()]
+    return sorted(fichier for fichier in fichiers if fichier[2])
+
+def ranger_fichiers_deposes(avancer):
+    """Range les PDF déposés à la main. Chaque lot est enregistré avant que ses originaux soient
+    déplacés : un rangement interrompu reprend là où il s'était arrêté"""
+    fichiers = fichiers_a_ranger()
+    resume = {'ranges': 0, 'erreurs': []}
+    os.makedirs(DOSSIER_IMPORTES, exist_ok=True)
+    for debut in range(0, len(fichiers), TAILLE_LOT_RANGEMENT):
+        lot, documents = [], []
+        for nom, chemin, cle in fichiers[debut:debut + TAILLE_LOT_RANGEMENT]:
+            try:
+                with open(chemin, 'rb') as f:
+                    documents.append(cle + depot_documents.stocker(f))
+            except FileNotFoundError:
+                # Rangé au même moment par un autre rangement
+                continue
+            except OSError as erreur:
+                resume['erreurs'].append({'fichier': nom, 'raison': str(erreur)})
+                continue
+            lot.append((nom, chemin))
+        if documents:
+            enregistrer_documents(documents)
+        for (nom, chemin), document in zip(lot, documents):
+            sauvegarde = os.path.join(DOSSIER_IMPORTES, nom)
+            if os.path.exists(sauvegarde):
+                # Même nom déjà mis de côté : l'empreinte distingue les deux originaux
+                sauvegarde = os.path.join(DOSSIER_IMPORTES, f"{nom[:-4]}-{document[3][:12]}.pdf")
+            try:
+                os.replace(chemin, sauvegarde)
+            except FileNotFoundError:
+                pass
+        resume['ranges'] += len(lot)
+        nombre = min(debut + TAILLE_LOT_RANGEMENT, len(fichiers))
+        avancer(nombre / len(fichiers), f"{nombre}/{len(fichiers)} fichier(s) rangé(s)")
+    if resume['ranges']:
+        logger.info("%d fichier(s) déposé(s) à la main rangé(s) dans le dépôt", resume['ranges'])
+    return resume
+
+@travaux.gestionnaire('rangement')
+def travail_rangement(parametres, avancer):
+    return dict(ranger_fichiers_deposes(avancer), version=version_courante())
+
+@travaux.gestionnaire('verification')
+def travail_verification(parametres, avancer):
+    """Relit chaque document courant : contenu présent, SHA-256 égal à son empreinte, taille et CRC-32 connus"""
+    documents = {}
+    for cle, empreinte in index_documents.presence().items():
+        documents.setdefault(empreinte, []).append(nom_fichier_document(*cle))
+    connus = depot_documents.infos_objets(())
+    
+    erreurs = []
+    for nombre, (empreinte, noms) in enumerate(documents.items(), 1):
+        try:
+            sha, taille, crc = depot_documents.relire(empreinte)
+        except FileNotFoundError:
+            erreurs += [{'fichier': nom, 'raison': "Contenu absent du dépôt"} for nom in noms]
+        else:
+            if sha != empreinte or connus.get(empreinte, (taille, crc)) != (taille, crc):
+                erreurs += [{'fichier': nom, 'raison': "Contenu altéré"} for nom in noms]
+        if nombre % 20 == 0 or nombre == len(documents):
+            avancer(nombre / len(documents), f"{nombre}/{len(documents)} contenu(s) vérifié(s)")
+    return {'verifies': sum(len(noms) for noms in documents.values()), 'erreurs': erreurs}
+
+class IndexTexte:
+    """Recherche plein texte dans les PDF : extraction par des travaux en arrière-plan
+    (pool de processus, pdfium n'est pas thread-safe), index FTS5 dans la base des documents"""
+
+    def __init__(self, depot, travailleurs):
+        self.depot = depot
+        self.travailleurs = travailleurs
+        self.disponible = pdfium is not None and depot.recherche_disponible
+        self._verrou = threading.Lock()
+        self._pool = None
+        self._rattrapage = False
+
+    def planifier(self, empreintes):
+        """Met en file l'extraction du texte de ces contenus (ceux déjà connus sont ignorés)"""
+        if self.disponible:
+            empreintes = [empreinte for empreinte in empreintes if not self.depot.texte_connu(empreinte)]
+            if empreintes:
+                travaux.soumettre('indexation', {'empreintes': empreintes})
+
+    def rattraper(self):
+        """Une fois par processus : indexe les documents déposés avant la recherche plein texte"""
+        with self._verrou:
+            if self._rattrapage or not self.disponible:
+                return
+            self._rattrapage = True
+        self.planifier(self.depot.empreintes_sans_texte())
+
+    def extraire(self, empreinte):
+        """Texte du contenu ; None si le pool a cassé (rien n'est mémorisé, nouvel essai au rattrapage)"""
+        with self._verrou:
+            if self._pool is None:
+                self._pool = pool_processus(self.travailleurs)
+            pool = self._pool
+        try:
+            travail = pool.submit(traitements_pdf.extraire_texte, self.depot.chemin_objet(empreinte),
+                                  MAX_CARACTERES_TEXTE)
+        except (BrokenExecutor, RuntimeError) as erreur:
+            return self._pool_casse(pool, empreinte, erreur)
+        try:
+            return travail.result()
+        except BrokenExecutor as erreur:
+            return self._pool_casse(pool, empreinte, erreur)
+        except Exception as erreur:
+            # PDF illisible, mémorisé vide : pas de nouvel essai pour ce contenu
+            logger.warning("Texte illisible pour %s : %s", empreinte, erreur)
+            return ""
+
+    def _pool_casse(self, pool, empreinte, erreur):
+        # Fils tué ou pool arrêté : recréé pour les contenus suivants
+        logger.warning("Extraction interrompue pour %s : %s", empreinte, erreur)
+        with self._verrou:
+            if self._pool is pool:
+                self._pool = None
+
+    def rechercher(self, texte, limite=RESULTATS_RECHERCHE):
+        """Documents contenant tous les mots saisis, chacun comme préfixe ("coffr" trouve "coffrage")"""
+        mots = re.findall(r"\w+", texte or "")
+        if not mots or not self.disponible:
+            return []
+        return self.depot.rechercher([f'"{mot}"*' for mot in mots], limite)
+
+index_texte = IndexTexte(depot_documents, TRAVAILLEURS_TEXTE)
+
+@travaux.gestionnaire('indexation')
+def travail_indexation(parametres, avancer):
+    """Extrait et indexe le texte des contenus demandés"""
+    empreintes = parametres['empreintes']
+    for nombre, empreinte in enumerate(empreintes, 1):
+        if not depot_documents.texte_connu(empreinte):
+            texte = index_texte.extraire(empreinte)
+            if texte is not None:
+                depot_documents.enregistrer_texte(empreinte, texte)
+        avancer(nombre / len(empreintes), f"{nombre}/{len(empreintes)} document(s) indexé(s)")
+    return {'indexes': len(empreintes)}
+
+# À partir de là, tailles et positions dans le ZIP passent par les enregistrements ZIP64
+LIMITE_ZIP32 = 0xFFFFFFFF
+
+def date_dos(horodatage):
+    """(heure, date) au format MS-DOS des en-têtes ZIP"""
+    t = time.localtime(max(horodatage, 315532800))  # pas avant 1980
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+class ExportZip:
+    """ZIP sans compression (les PDF le sont déjà) dont toute la structure est calculée d'avance :
+    taille totale connue, mêmes octets à chaque requête, donc reprise possible avec Range.
+    Les fichiers sont lus bloc par bloc au moment de l'envoi, jamais chargés ni recopiés"""
+
+    def __init__(self, entrees):
+        # entrees : [(nom dans le ZIP, source, taille, crc32, horodatage)] ; source = chemin ou bytes
+        self.segments = []
+        self.taille = 0
+        centrale = []
+        for nom, source, taille, crc, horodatage in entrees:
+            nom = nom.encode('utf-8')
+            heure, date = date_dos(horodatage)
+            position = self.taille
+            # Fichier de 4 Gio ou plus : tailles 0xFFFFFFFF et vraies tailles dans l'extra ZIP64
+            grand = taille >= LIMITE_ZIP32
+            taille32 = LIMITE_ZIP32 if grand else taille
+            extra = struct.pack("<HHQQ", 0x0001, 16, taille, taille) if grand else b""
+            # Drapeau 0x0800 : nom en UTF-8
+            self._ajouter(struct.pack("<IHHHHHIIIHH", 0x04034b50, 45 if grand else 20, 0x0800, 0, heure, date,
+                                      crc, taille32, taille32, len(nom), len(extra)) + nom + extra)
+            self._ajouter(source, taille)
+            
+            # Extra central : seulement les champs marqués 0xFFFFFFFF, dans l'ordre tailles puis position
+            champs64 = [taille, taille] if grand else []
+            if position >= LIMITE_ZIP32:
+                champs64.append(position)
+            extra = struct.pack(f"<HH{len(champs64)}Q", 0x0001, 8 * len(champs64), *champs64) if champs64 else b""
+            centrale.append(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014b50, 0x0300 | 45, 45 if extra else 20, 0x0800, 0, heure, date,
+                crc, taille32, taille32, len(nom), len(extra), 0, 0, 0, 0o100644 << 16,
+                min(position, LIMITE_ZIP32)
+            ) + nom + extra)
+        
+        debut_centrale = self.taille
+        centrale = b"".join(centrale)
+        nb = len(entrees)
+        fin = b""
+        zip64 = debut_centrale + len(centrale) >= LIMITE_ZIP32 or nb >= 0xFFFF
+        if zip64:
+            position_fin64 = debut_centrale + len(centrale)
+            fin += struct.pack("<IQHHIIQQQQ", 0x06064b50, 44, 45, 45, 0, 0, nb, nb, len(centrale), debut_centrale)
+            fin += struct.pack("<IIQI", 0x07064b50, 0, position_fin64, 1)
+        fin += struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, min(nb, 0xFFFF), min(nb, 0xFFFF), len(centrale),
+                           0xFFFFFFFF if zip64 else debut_centrale, 0)
+        self._ajouter(centrale + fin)
+
+    def _ajouter(self, source, taille=None):
+        taille = len(source) if taille is None else taille
+        self.segments.append((self.taille, self.taille + taille, source))
+        self.taille += taille
+
+    def lire(self, debut=0, fin=None):
+        """Générateur des octets [debut, fin) de l'archive, par blocs de TAILLE_BLOC au plus"""
+        fin = self.taille if fin is None else fin
+        for segment_debut, segment_fin, source in self.segments:
+            if segment_fin <= debut or segment_debut >= fin:
+                continue
+            a, b = max(debut, segment_debut) - segment_debut, min(fin, segment_fin) - segment_debut
+            if isinstance(source, bytes):
+                yield source[a:b]
+                continue
+            with open(source, 'rb') as f:
+                f.seek(a)
+                restant = b - a
+                while restant:
+                    bloc = f.read(min(TAILLE_BLOC, restant))
+                    if not bloc:
+                        raise IOError(f"Fichier tronqué pendant l'export : {source}")
+                    restant -= len(bloc)
+                    yield bloc
+
+def contenu_export(villa=None, tache=None):
+    """(ExportZip, etag) des documents courants d'une villa, d'une tâche ou de tout le projet,
+    avec manifeste.csv (statut et empreinte de chaque document attendu)"""
+    villas = [villa] if villa else LISTE_VILLAS
+    taches = [tache] if tache else LISTE_TACHES
+    presents = index_documents.presence()
+    codes = cache_statuts.obtenir()
+    infos = depot_documents.infos_objets(presents.values())
+    
+    manifeste = io.StringIO()
+    ecrivain = csv.writer(manifeste, delimiter=";", lineterminator="\r\n")
+    ecrivain.writerow(["Villa", "Tâche", "Statut", "Type de document", "Fichier", "SHA-256"])
+    entrees = []
+    for v in villas:
+        for t in taches:
+            statut = STATUTS[codes[INDEX_TACHES[t], INDEX_VILLAS[v]]]
+            for type_doc in get_types_docs_pour_tache(t):
+                empreinte = presents.get((t, v, type_doc))
+                chemin = depot_documents.chemin_objet(empreinte) if empreinte else None
+                if empreinte in infos:
+                    metriques.noter_fs()
+                if empreinte not in infos or not os.path.isfile(chemin):
+                    ecrivain.writerow([v, t, statut, type_doc, "", ""])
+                    continue
+                nom = f"{v}/{nom_fichier_document(t, v, type_doc)}"
+                taille, crc = infos[empreinte]
+                metriques.noter_fs()
+                entrees.append((nom, chemin, taille, crc, os.stat(chemin).st_mtime))
+                ecrivain.writerow([v, t, statut, type_doc, nom, empreinte])
+    # BOM : Excel ouvre le manifeste en UTF-8. Daté comme le document le plus récent,
+    # pour que la même sélection donne toujours les mêmes octets
+    manifeste = manifeste.getvalue().encode('utf-8-sig')
+    date_manifeste = max((horodatage for *_, horodatage in entrees), default=0)
+    entrees.insert(0, ("manifeste.csv", manifeste, len(manifeste), zlib.crc32(manifeste), date_manifeste))
+    
+    description = [(nom, taille, crc, int(horodatage)) for nom, _, taille, crc, horodatage in entrees]
+    etag = hashlib.sha1(manifeste + repr(description).encode()).hexdigest()
+    return ExportZip(entrees), etag
+
+def matrice_completude():
+    """Nombre de documents présents par (tâche, villa), en une seule passe sur l'index"""
+    # Seuls les types attendus par le schéma comptent : un type retiré de NORIA_PROJET reste en base
+    comptes = Counter(
+        (tache, villa) for tache, villa, type_doc in index_documents.presence()
+        if type_doc in get_types_docs_pour_tache(tache)
+    )
+    if not comptes:
+        return pd.DataFrame(0, index=LISTE_TACHES, columns=LISTE_VILLAS)
+    return (pd.Series(comptes).unstack(fill_value=0)
+            .reindex(index=LISTE_TACHES, columns=LISTE_VILLAS, fill_value=0))
+
+def libelle_completude(nb_presents, tache):
+    return f"{nb_presents}/{len(get_types_docs_pour_tache(tache))}"
+
+# Tranches d'avancement des villas (part des tâches OK) pour la page d'analyse
+TRANCHES_AVANCEMENT = [-0.01, 0.25, 0.5, 0.75, 0.999, 1.0]
+LIBELLES_TRANCHES = ["0-25 %", "25-50 %", "50-75 %", "75-99 %", "100 %"]
+SEMAINES_DEBIT = 12
+
+@lru_cache(maxsize=1)
+def _indicateurs(signature, depuis):
+    # Mémoïsé par signature du stockage et début de la fenêtre de débit : recalculé
+    # après une écriture ou au passage d'une semaine à la suivante
+    codes = cache_statuts.obtenir()
+    # Comptes par axe directement sur la matrice de codes, sans boucle sur les cases
+    par_tache = pd.DataFrame({statut: (codes == i).sum(axis=1) for i, statut in enumerate(STATUTS)}, index=LISTE_TACHES)
+    par_villa = pd.DataFrame({statut: (codes == i).sum(axis=0) for i, statut in enumerate(STATUTS)}, index=LISTE_VILLAS)
+    taux_villas = par_villa["OK"] / len(LISTE_TACHES)
+    
+    # Débit : passages à OK / Non Conforme par semaine (lundi 0 h, heure locale), comptés par SQLite sur le journal.
+    # depuis est naïf en heure locale : converti comme datetime.timestamp, pas comme Timestamp.timestamp (UTC)
+    debit = cache_statuts.stockage.changements_par_semaine(
+        depuis.to_pydatetime().timestamp(), SEMAINES_DEBIT, ["OK", "Non Conforme"])
+    if debit is not None:
+        debit.index = pd.date_range(depuis, periods=SEMAINES_DEBIT, freq='7D')
+    
+    return {
+        'taux_global': float((codes == CODES_STATUTS["OK"]).mean()),
+        'par_tache': par_tache.assign(taux=par_tache["OK"] / len(LISTE_VILLAS)),
+        'villas_terminees': int((taux_villas == 1).sum()),
+        'tranches': pd.cut(taux_villas, TRANCHES_AVANCEMENT, labels=LIBELLES_TRANCHES).value_counts(sort=False),
+        'villas_en_retard': taux_villas.nsmallest(10),
+        'points_chauds': par_villa["Non Conforme"][par_villa["Non Conforme"] > 0].nlargest(10),
+        'debit': debit
+    }
+
+@lru_cache(maxsize=1)
+def _temps_non_conforme(signature, jour):
+    # Mémoïsé par signature et par jour : les épisodes encore ouverts s'allongent chaque jour
+    evenements = cache_statuts.stockage.evenements(statut="Non Conforme")
+    if evenements is None:
+        return None
+    # Un épisode commence à l'entrée en Non Conforme et finit à l'événement suivant de la même case
+    # (forcément une sortie). Une sortie sans entrée journalisée est antérieure au journal : ignorée
+    fin = evenements.groupby(['tache', 'villa'], sort=False)['date'].shift(-1)
+    entrees = evenements['nouveau'] == "Non Conforme"
+    episodes = pd.DataFrame({
+        'tache': evenements.loc[entrees, 'tache'],
+        'ouvert': fin[entrees].isna(),
+        'jours': (fin[entrees].fillna(pd.Timestamp.now()) - evenements.loc[entrees, 'date']) / pd.Timedelta(days=1)
+    })
+    par_tache = episodes.groupby('tache').agg(
+        episodes=('jours', 'size'), mediane=('jours', 'median'), maximum=('jours', 'max'), ouverts=('ouvert', 'sum')
+    )
+    return par_tache.reindex([tache for tache in LISTE_TACHES if tache in par_tache.index])
+
+def temps_non_conforme():
+    """Par tâche : nombre de passages en Non Conforme, durée médiane et maximale (jours), épisodes encore
+    ouverts ; None sans historique (stockage CSV)"""
+    return _temps_non_conforme(cache_statuts.stockage.signature(), datetime.now().date())
+
+def indicateurs_avancement():
+    """Taux d'avancement par tâche et par villa, points chauds Non Conforme et débit hebdomadaire"""
+    aujourd_hui = pd.Timestamp.now().normalize()
+    depuis = aujourd_hui - pd.Timedelta(days=aujourd_hui.weekday(), weeks=SEMAINES_DEBIT - 1)
+    return _indicateurs(cache_statuts.stockage.signature(), depuis)
+
 # =====================================================
 # INITIALISATION DE L'APP DASH
 # =====================================================
 
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+# Les pages sont construites à la demande : leurs composants n'existent pas dans le layout initial
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True)
 app.title = "Suivi Chantier Noria"
 server = app.server
 
+# Mesure de chaque requête (routes Flask et callbacks Dash) si NORIA_METRIQUES=1
+@server.before_request
+def debut_mesure():
+    if not METRIQUES_ACTIVES:
+        return
+    g.noria_debut = time.perf_counter()
+    if PROFIL_SEUIL_MS > 0 and random.random() < PROFIL_TAUX:
+        g.noria_profil = cProfile.Profile()
+        g.noria_profil.enable()
+
+def cible_requete():
+    """Nom de la route, ou sorties du callback pour les appels Dash"""
+    if request.path.endswith('/_dash-update-component'):
+        corps = request.get_json(silent=True) or {}
+        return f"callback:{corps.get('output', '?')}"
+    return request.url_rule.rule if request.url_rule else "inconnue"
+
+@server.after_request
+def fin_mesure(response):
+    if not METRIQUES_ACTIVES or 'noria_debut' not in g:
+        return response
+    duree = time.perf_counter() - g.noria_debut
+    cible = cible_requete()
+    metriques.noter_requete(
+        # Réponses en flux (fichiers, exports) : taille annoncée, sans consommer le flux
+        cible, duree, response.calculate_content_length() or response.content_length or 0,
+        g.get('noria_stockage', 0.0), g.get('noria_fs', 0)
+    )
+    
+    profil = g.get('noria_profil')
+    if profil is not None:
+        profil.disable()
+        if duree * 1000 >= PROFIL_SEUIL_MS:
+            os.makedirs(DOSSIER_PROFILS, exist_ok=True)
+            nom = re.sub(r"[^A-Za-z0-9_.-]+", "_", cible)[:80]
+            chemin = os.path.join(DOSSIER_PROFILS, f"{datetime.now():%Y%m%d-%H%M%S-%f}_{nom}.prof")
+            profil.dump_stats(chemin)
+            logger.info("Requête lente (%.0f ms) profilée : %s", duree * 1000, chemin)
+    return response
+
+@server.route('/metrics')
+def metrics():
+    """Métriques du worker courant au format Prometheus"""
+    if not METRIQUES_ACTIVES:
+        return "Métriques désactivées (NORIA_METRIQUES=1)", 404
+    return Response(metriques.exposition(cache_statuts.statistiques()),
+                    mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+# Les caches de chaque worker se valident déjà sur les compteurs de version du stockage partagé ;
+# cette route expose ces compteurs aux navigateurs, qui ne rechargent rien tant qu'ils ne bougent pas
+def version_courante():
+    """Jeton de version des statuts et des documents, le même dans tous les workers"""
+    return hashlib.sha1(
+        repr((cache_statuts.stockage.signature(), index_documents.signature())).encode()
+    ).hexdigest()[:16]
+
+@server.route('/version')
+def version_donnees():
+    """Version courante des statuts et des documents (ETag : 304 si rien n'a changé)"""
+    version = version_courante()
+    response = jsonify({'version': version})
+    response.set_etag(version)
+    response.headers['Cache-Control'] = "no-cache"
+    return response.make_conditional(request)
+
+if X_SENDFILE:
+    # Flask 3 : réglage lu par send_file dans la configuration (l'ancien attribut n'existe plus)
+    server.config['USE_X_SENDFILE'] = True
+
+MOTIF_EMPREINTE = re.compile(r"^[0-9a-f]{64}$")
+
+def resoudre_document(filename):
+    """(clé, empreinte) du document demandé par son nom ; ?v=<empreinte> désigne une version
+    précise, y compris une version remplacée depuis. 404 si rien ne correspond"""
+    cle = index_documents.cle_pour_nom(filename)
+    if cle is None:
+        abort(404)
+    empreinte = index_documents.empreinte(*cle)
+    demandee = request.args.get('v', '')
+    if demandee != empreinte and MOTIF_EMPREINTE.match(demandee) and depot_documents.version_existe(*cle, demandee):
+        empreinte = demandee
+    if empreinte is not None:
+        metriques.noter_fs()
+    if empreinte is None or not os.path.isfile(depot_documents.chemin_objet(empreinte)):
+        abort(404)
+    return cle, empreinte
+
+def content_disposition(response, disposition, nom_fichier):
+    """Content-Disposition comme send_file : nom ASCII de repli, nom UTF-8 complet en filename* (RFC 5987).
+    Un nom hors latin-1 écrit tel quel dans l'en-tête fait échouer la réponse"""
+    try:
+        nom_fichier.encode('ascii')
+        noms = {'filename': nom_fichier}
+    except UnicodeEncodeError:
+        repli = unicodedata.normalize('NFKD', nom_fichier).encode('ascii', 'ignore').decode('ascii')
+        noms = {'filename': repli, 'filename*': f"UTF-8''{quote(nom_fichier, safe='!#$&+^`|~')}"}
+    response.headers.set('Content-Disposition', disposition, **noms)
+
+def servir_pdf(filename, telechargement):
+    """Envoie un PDF avec ETag / Last-Modified (réponses 304), Range (206) et cache long si l'URL est versionnée"""
+    _, empreinte = resoudre_document(filename)
+    chemin = depot_documents.chemin_objet(empreinte)
+    
+    if X_ACCEL_PREFIXE:
+        # nginx lit le fichier lui-même (et gère Range / conditionnels) : le worker est libéré tout de suite
+        relatif = os.path.relpath(chemin, os.path.abspath(DOSSIER_FICHIERS)).replace(os.sep, '/')
+        response = Response(mimetype='application/pdf')
+        response.headers['X-Accel-Redirect'] = f"{X_ACCEL_PREFIXE.rstrip('/')}/{quote(relatif)}"
+        content_disposition(response, 'attachment' if telechargement else 'inline', filename)
+    else:
+        response = send_file(
+            chemin,
+            mimetype='application/pdf',
+            as_attachment=telechargement,
+            download_name=filename,
+            conditional=True,
+            etag=empreinte
+        )
+    return cache_versionne(response, empreinte)
+
+def cache_versionne(response, version):
+    """Cache d'un an si l'URL porte la version courante, sinon revalidation (304 si inchangé)"""
+    if request.args.get('v') == version:
+        response.headers['Cache-Control'] = f"private, max-age={DUREE_CACHE_PDF}, immutable"
+    else:
+        response.headers['Cache-Control'] = "private, no-cache"
+    return response
+
 # Route pour servir les fichiers
 @server.route('/download/<path:filename>')
 def download_file(filename):
     """Sert les fichiers PDF depuis le dossier fichiers_chantier"""
-    return send_from_directory(
-        os.path.abspath(DOSSIER_FICHIERS), 
-        filename, 
-        as_attachment=False,
-        mimetype='application/pdf'
-    )
+    return servir_pdf(filename, telechargement=False)
 
 @server.route('/download-file/<path:filename>')
 def download_file_attachment(filename):
     """Force le téléchargement du fichier"""
-    return send_from_directory(
-        os.path.abspath(DOSSIER_FICHIERS), 
-        filename, 
-        as_attachment=True,
-        download_name=filename,
-        mimetype='application/pdf'
+    return servir_pdf(filename, telechargement=True)
+
+def envoyer_export(export, etag, nom_fichier):
+    """Archive envoyée en flux (mémoire bornée) : 200, 206 pour une reprise avec Range / If-Range, ou 304"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    
+    debut, fin, statut = 0, export.taille, 200
+    plage = request.range
+    # If-Range : la reprise n'est acceptée que si l'archive n'a pas changé depuis le début du téléchargement
+    if_range = request.if_range
+    plage_valide = if_range.etag == etag or (if_range.etag is None and if_range.date is None)
+    if plage is not None and len(plage.ranges) == 1 and plage_valide:
+        bornes = plage.range_for_length(export.taille)
+        if bornes is None:
+            return Response(status=416, headers={'Content-Range': f"bytes */{export.taille}"})
+        debut, fin = bornes
+        statut = 206
+    
+    response = Response(export.lire(debut, fin), status=statut, mimetype='application/zip', direct_passthrough=True)
+    response.content_length = fin - debut
+    if statut == 206:
+        response.headers['Content-Range'] = f"bytes {debut}-{fin - 1}/{export.taille}"
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.set_etag(etag)
+    content_disposition(response, 'attachment', nom_fichier)
+    response.headers['Cache-Control'] = "private, no-cache"
+    return response
+
+def nom_export(libelle):
+    return "Noria_" + re.sub(r"[^\w-]+", "_", libelle).strip("_") + ".zip"
+
+# Exports ZIP : tous les documents courants + manifeste.csv des statuts
+@server.route('/export/projet.zip')
+def export_projet():
+    return envoyer_export(*contenu_export(), nom_export("projet"))
+
+@server.route('/export/villa/<int:villa_idx>.zip')
+def export_villa(villa_idx):
+    if not 0 <= villa_idx < len(LISTE_VILLAS):
+        abort(404)
+    villa = LISTE_VILLAS[villa_idx]
+    return envoyer_export(*contenu_export(villa=villa), nom_export(villa))
+
+@server.route('/export/tache/<int:tache_idx>.zip')
+def export_tache(tache_idx):
+    if not 0 <= tache_idx < len(LISTE_TACHES):
+        abort(404)
+    tache = LISTE_TACHES[tache_idx]
+    return envoyer_export(*contenu_export(tache=tache), nom_export(tache))
+
+@server.route('/apercu/<path:filename>')
+def apercu_document(filename):
+    """Miniature JPEG de la première page d'un PDF, une fois générée"""
+    _, empreinte = resoudre_document(filename)
+    if apercus.etat(empreinte, depot_documents.chemin_objet(empreinte)) is not True:
+        abort(404)
+    response = send_file(apercus.chemin(empreinte), mimetype='image/jpeg', conditional=True, etag=empreinte)
+    return cache_versionne(response, empreinte)
+
+def est_admin(mot_de_passe):
+    # Comparaison des octets UTF-8 : compare_digest refuse les chaînes non ASCII
+    return hmac.compare_digest((mot_de_passe or "").encode(), MOT_DE_PASSE_ADMIN.encode())
+
+# Route d'upload : le fichier arrive en multipart et est recopié par blocs,
+# sans passer par le JSON base64 d'un callback Dash
+@server.route('/upload/<int:tache_idx>/<int:villa_idx>/<type_doc>', methods=['POST'])
+def upload_file(tache_idx, villa_idx, type_doc):
+    """Reçoit un PDF pour une tâche/villa/type (envoyé par assets/upload_noria.js)"""
+    if not est_admin(request.headers.get('X-Noria-Admin')):
+        return jsonify({'erreur': "Mode édition requis"}), 403
+    if not (0 <= tache_idx < len(LISTE_TACHES) and 0 <= villa_idx < len(LISTE_VILLAS)):
+        return jsonify({'erreur': "Tâche ou villa inconnue"}), 404
+    tache = LISTE_TACHES[tache_idx]
+    if type_doc not in get_types_docs_pour_tache(tache):
+        return jsonify({'erreur': f"Type de document inconnu : {type_doc}"}), 404
+    
+    fichier = request.files.get('fichier')
+    if fichier is None:
+        return jsonify({'erreur': "Aucun fichier reçu"}), 400
+    villa = LISTE_VILLAS[villa_idx]
+    travail_id = travaux.soumettre('import', {
+        'fichiers': [{
+            'chemin': mettre_en_attente(fichier.stream),
+            'nom': fichier.filename or nom_fichier_document(tache, villa, type_doc),
+            'cle': [tache, villa, type_doc]
+        }],
+        'ignores': []
+    })
+    return reponse_travail(travail_id)
+
+# Import groupé : tous les PDF d'un lot en une requête, rangés d'après leur nom
+@server.route('/upload-lot', methods=['POST'])
+def upload_lot():
+    """Reçoit plusieurs PDF ; le résumé de l'import est le résultat du travail en arrière-plan"""
+    if not est_admin(request.headers.get('X-Noria-Admin')):
+        return jsonify({'erreur': "Mode édition requis"}), 403
+    
+    ignores = []
+    a_ecrire = {}
+    for fichier in request.files.getlist('fichiers'):
+        cle = identifier_document(fichier.filename or "")
+        if cle is None:
+            ignores.append({'fichier': fichier.filename, 'raison': "Nom non reconnu"})
+        elif cle in a_ecrire:
+            ignores.append({'fichier': fichier.filename, 'raison': "Doublon dans le lot"})
+        else:
+            a_ecrire[cle] = fichier
+    
+    travail_id = travaux.soumettre('import', {
+        'fichiers': [
+            {'chemin': mettre_en_attente(fichier.stream), 'nom': fichier.filename, 'cle': list(cle)}
+            for cle, fichier in a_ecrire.items()
+        ],
+        'ignores': ignores
+    })
+    return reponse_travail(travail_id)
+
+@server.route('/travaux/verification', methods=['POST'])
+def lancer_verification():
+    """Vérification d'intégrité de tous les documents courants, en arrière-plan"""
+    if not est_admin(request.headers.get('X-Noria-Admin')):
+        return jsonify({'erreur': "Mode édition requis"}), 403
+    return reponse_travail(travaux.soumettre('verification', {}))
+
+@server.route('/travaux/rangement', methods=['POST'])
+def lancer_rangement():
+    """Rangement dans le dépôt des PDF déposés à la main dans fichiers_chantier, en arrière-plan"""
+    if not est_admin(request.headers.get('X-Noria-Admin')):
+        return jsonify({'erreur': "Mode édition requis"}), 403
+    return reponse_travail(travaux.soumettre('rangement', {}))
+
+def reponse_travail(travail_id):
+    # 202 : accepté, le navigateur suit l'avancement sur l'URL indiquée
+    return jsonify({'travail': travail_id, 'suivi': f"/travaux/{travail_id}"}), 202
+
+# Avancement d'un travail : petite réponse JSON sondée par assets/upload_noria.js
+@server.route('/travaux/<int:travail_id>')
+def suivi_travail(travail_id):
+    etat = travaux.etat(travail_id)
+    if etat is None:
+        return jsonify({'erreur': "Travail inconnu"}), 404
+    response = jsonify(etat)
+    response.headers['Cache-Control'] = "no-store"
+    return response
+
+def id_document(type_composant, tache, villa, type_doc):
+    """Identifiant structuré (pattern-matching) d'un bouton lié à un document"""
+    return {'type': type_composant, 'tache': INDEX_TACHES[tache], 'villa': INDEX_VILLAS[villa], 'doc': type_doc}
+
+def decoder_id_document(id_composant):
+    """(tâche, villa, type_doc) d'un identifiant créé par id_document, ou None s'il est invalide"""
+    tache_idx, villa_idx = id_composant.get('tache'), id_composant.get('villa')
+    if not isinstance(tache_idx, int) or not 0 <= tache_idx < len(LISTE_TACHES):
+        return None
+    if not isinstance(villa_idx, int) or not 0 <= villa_idx < len(LISTE_VILLAS):
+        return None
+    tache = LISTE_TACHES[tache_idx]
+    if id_composant.get('doc') not in get_types_docs_pour_tache(tache):
+        return None
+    return tache, LISTE_VILLAS[villa_idx], id_composant['doc']
+
+def composant_apercu(fichier_info, url_vue):
+    """Miniature cliquable de la première page, ou mention d'attente tant qu'elle n'est pas prête"""
+    if fichier_info['apercu'] is False:
+        return None
+    if fichier_info['apercu'] is None:
+        return html.Small("⏳ Aperçu en préparation…", className="text-muted d-block mb-2")
+    return html.A(
+        html.Img(
+            src=f"/apercu/{fichier_info['nom']}?v={fichier_info['version']}",
+            alt=f"Aperçu de {fichier_info['nom']}",
+            style={'maxWidth': '100%', 'maxHeight': '160px', 'border': '1px solid #ddd'}
+        ),
+        href=url_vue, target="_blank", className="d-block mb-2"
     )
 
+def composant_upload(tache, villa, type_doc, texte, color, className=""):
+    """Bouton d'upload : le navigateur envoie le fichier directement à la route /upload"""
+    url = f"/upload/{INDEX_TACHES[tache]}/{INDEX_VILLAS[villa]}/{type_doc}"
+    return html.Button(texte, className=f"btn btn-{color} btn-sm {className}".strip(), **{'data-upload-url': url})
+
 # =====================================================
 # LAYOUT PRINCIPAL - NAVIGATION À GAUCHE, CONTENU À DROITE
 # =====================================================
 
 app.layout = dbc.Container([
     
-    # Store pour garder les sélections
-    dcc.Store(id='selected-cell', data={'row': 0, 'column': 0}),
+    # Store pour garder les sélections (vide tant qu'aucune case n'a été cliquée)
+    dcc.Store(id='selected-cell', data=None),
     dcc.Store(id='is-admin', data=False),
     dcc.Store(id='current-page', data='tableau'),
     dcc.Store(id='refresh-trigger', data=0),
+    # Version après la dernière écriture de ce navigateur, transmise à assets/synchro_noria.js
+    dcc.Store(id='version-locale', data=None),
+    # Cliqué par assets/upload_noria.js quand un upload est terminé
+    html.Button(id='btn-upload-termine', n_clicks=0, style={'display': 'none'}),
+    # Cliqué par assets/synchro_noria.js quand /version change (modification d'un autre poste)
+    html.Button(id='btn-donnees-modifiees', n_clicks=0, style={'display': 'none'},
+                **{'data-version-url': '/version', 'data-intervalle-ms': INTERVALLE_SYNCHRO_MS}),
     
     # Titre Principal
     dbc.Row([
         dbc.Col([
-            html.H1("🏗️ Suivi Chantier Noria - 108 Villas", className="text-center mb-4 mt-3")
+            html.H1(f"🏗️ Suivi Chantier Noria - {len(LISTE_VILLAS)} Villas", className="text-center mb-4 mt-3")
         ])
     ]),
     
@@ -177,7 +2216,8 @@ app.layout = dbc.Container([
                     html.H5("🗂️ Navigation", className="mb-3"),
                     html.Hr(),
                     html.H6("🔒 Espace Ingénieur"),
-                    dbc.Input(id="password-input", type="password", placeholder="Mot de passe Admin", className="mb-2"),
+                    # debounce : vérifié à la validation (Entrée / sortie du champ), pas à chaque touche
+                    dbc.Input(id="password-input", type="password", placeholder="Mot de passe Admin", className="mb-2", debounce=True),
                     html.Div(id="admin-status", className="mb-3"),
                     html.Hr(),
                     dbc.RadioItems(
@@ -185,7 +2225,9 @@ app.layout = dbc.Container([
                         options=[
                             {"label": "📊 Tableau de Suivi Général", "value": "tableau"},
                             {"label": "📁 Dossier de démarrage", "value": "dossier"},
-                            {"label": "📂 Suivi de chaque tâche", "value": "suivi"}
+                            {"label": "📂 Suivi de chaque tâche", "value": "suivi"},
+                            {"label": "📈 Analyse de l'avancement", "value": "analyse"},
+                            {"label": "🔎 Recherche dans les documents", "value": "recherche"}
                         ],
                         value="tableau"
                     )
@@ -206,94 +2248,234 @@ app.layout = dbc.Container([
 # =====================================================
 
 # Vérification du mot de passe admin
+# is-admin n'est réécrit que s'il change : les callbacks qui en dépendent ne repartent pas pour rien
 @app.callback(
     [Output('is-admin', 'data'),
      Output('admin-status', 'children')],
-    Input('password-input', 'value')
+    Input('password-input', 'value'),
+    State('is-admin', 'data')
 )
-def check_password(password):
-    if password == "Noria2026":
-        return True, dbc.Alert("Mode Édition Activé ✅", color="success", className="p-2")
+def check_password(password, is_admin):
+    admin = est_admin(password)
+    if admin:
+        message = dbc.Alert("Mode Édition Activé ✅", color="success", className="p-2")
     else:
-        return False, dbc.Alert("Mode Lecture Seule 👀", color="info", className="p-2")
+        message = dbc.Alert("Mode Lecture Seule 👀", color="info", className="p-2")
+    return (dash.no_update if admin == is_admin else admin), message
 
 # Gestion du contenu principal selon le menu
 @app.callback(
     Output('main-content', 'children'),
     [Input('menu-choice', 'value'),
-     Input('is-admin', 'data'),
-     Input('selected-cell', 'data'),
-     Input('refresh-trigger', 'data')]
+     Input('is-admin', 'data')]
 )
-def update_main_content(page, is_admin, selected_cell, refresh):
+def update_main_content(page, is_admin):
+    # La sélection et les rafraîchissements ne reconstruisent plus la page :
+    # l'inspecteur et les cases du tableau ont leurs propres callbacks.
+    # Seule la page de suivi dépend du mode édition
+    if ctx.triggered_id == 'is-admin' and page != "suivi":
+        return dash.no_update
     if page == "tableau":
-        return create_tableau_page(is_admin, selected_cell)
+        return create_tableau_page()
     elif page == "dossier":
         return create_dossier_page()
+    elif page == "analyse":
+        return create_analyse_page()
+    elif page == "recherche":
+        return create_recherche_page()
     else:
         return create_suivi_page(is_admin)
 
-def create_tableau_page(is_admin, selected_cell):
-    """Crée la page du tableau principal"""
-    df = charger_donnees()
+def construire_grille(completude=None, codes=None):
+    """Grille complète du tableau : une ligne par villa, une colonne statut + une colonne documents par tâche"""
+    if codes is None:
+        codes = cache_statuts.obtenir()
+    if completude is None:
+        completude = matrice_completude()
+    
+    # Une ligne par villa : le nombre de règles de style ne dépend que du nombre de tâches.
+    # Colonnes catégorielles ordonnées posées sur les codes (aucune chaîne recopiée par case) :
+    # le tri suit l'ordre des statuts / le nombre de documents, le décodage n'a lieu que pour la page envoyée
+    colonnes = {'id': np.arange(len(LISTE_VILLAS)), 'Villa': LISTE_VILLAS}
+    for (col_id, tache_idx), col_docs in zip(COLONNES_TACHES.items(), COLONNES_DOCS):
+        tache = LISTE_TACHES[tache_idx]
+        total = len(get_types_docs_pour_tache(tache))
+        colonnes[col_id] = pd.Categorical.from_codes(codes[tache_idx], dtype=TYPE_STATUTS)
+        colonnes[col_docs] = pd.Categorical.from_codes(
+            completude.loc[tache].to_numpy(), categories=[f"{n}/{total}" for n in range(total + 1)], ordered=True
+        )
+    return pd.DataFrame(colonnes)
+
+# Opérateurs produits par la ligne de filtre du DataTable (filter_action='custom')
+MOTIF_FILTRE = re.compile(
+    r"^\{(?P<colonne>[^}]+)\}\s*(?P<operateur>[si]?(?:eq|ne|lt|le|gt|ge|contains)|datestartswith|!=|<=|>=|=|<|>)\s*(?P<valeur>.*)$"
+)
+OPERATEURS_FILTRE = {'=': 'eq', '!=': 'ne', '<': 'lt', '<=': 'le', '>': 'gt', '>=': 'ge'}
+
+def filtrer_grille(grille, filter_query):
+    """Applique le filter_query du DataTable à la grille (opérations vectorisées pandas)"""
+    for partie in (filter_query or "").split(" && "):
+        correspondance = MOTIF_FILTRE.match(partie.strip())
+        if not correspondance or correspondance['colonne'] not in grille.columns:
+            continue
+        colonne = grille[correspondance['colonne']].astype(str)
+        valeur = correspondance['valeur'].strip()
+        if len(valeur) >= 2 and valeur[0] == valeur[-1] and valeur[0] in "\"'`":
+            valeur = valeur[1:-1]
+        operateur = OPERATEURS_FILTRE.get(correspondance['operateur'], correspondance['operateur'])
+        
+        # Préfixe i = insensible à la casse (le défaut), s = sensible
+        sensible = operateur.startswith('s')
+        operateur = operateur.lstrip('si') if operateur != 'datestartswith' else operateur
+        if not sensible:
+            colonne, valeur = colonne.str.lower(), valeur.lower()
+        
+        if operateur == 'contains':
+            masque = colonne.str.contains(valeur, regex=False)
+        elif operateur == 'datestartswith':
+            masque = colonne.str.startswith(valeur)
+        elif operateur == 'eq':
+            masque = colonne == valeur
+        elif operateur == 'ne':
+            masque = colonne != valeur
+        elif operateur == 'lt':
+            masque = colonne < valeur
+        elif operateur == 'le':
+            masque = colonne <= valeur
+        elif operateur == 'gt':
+            masque = colonne > valeur
+        else:
+            masque = colonne >= valeur
+        grille = grille[masque]
+    return grille
+
+def trier_grille(grille, sort_by):
+    """Tri selon sort_by : villas dans l'ordre du chantier, statuts dans l'ordre d'avancement"""
+    for tri in reversed(sort_by or []):
+        colonne = tri['column_id']
+        if colonne not in grille.columns:
+            continue
+        # Colonnes catégorielles ordonnées : tri sur les codes
+        grille = grille.sort_values('id' if colonne == 'Villa' else colonne,
+                                    ascending=tri['direction'] == 'asc', kind='stable')
+    return grille
+
+def page_grille(page_current, page_size, sort_by, filter_query, codes=None):
+    """Retourne (lignes de la page demandée, nombre de pages) calculés côté serveur"""
+    grille = trier_grille(filtrer_grille(construire_grille(codes=codes), filter_query), sort_by)
+    page_size = page_size or PAGE_TAILLE
+    nb_pages = max(1, -(-len(grille) // page_size))
+    page_current = min(page_current or 0, nb_pages - 1)
+    debut = page_current * page_size
+    return grille.iloc[debut:debut + page_size].to_dict('records'), nb_pages
+
+def maj_cellule_grille(villa_idx, colonne, valeur, *etat_page):
+    """Met à jour une case dans la page affichée : Patch si possible, sinon page recalculée"""
+    return maj_cellules_grille([(villa_idx, colonne, valeur)], *etat_page)
+
+def maj_cellules_grille(cellules, page_current, page_size, sort_by, filter_query, date_historique=None):
+    """Met à jour les cases [(index villa, colonne, valeur)] de la page affichée, en un seul Patch"""
+    if date_historique:
+        # Le tableau montre un état passé : les modifications du jour n'y apparaissent pas
+        return dash.no_update
+    if sort_by or filter_query:
+        # L'ordre ou l'appartenance au filtre a pu changer : on renvoie la page (quelques Ko)
+        return page_grille(page_current, page_size, sort_by, filter_query)[0]
+    page = Patch()
+    modifiee = False
+    for villa_idx, colonne, valeur in cellules:
+        position = villa_idx - (page_current or 0) * (page_size or PAGE_TAILLE)
+        if 0 <= position < (page_size or PAGE_TAILLE):
+            page[position][colonne] = valeur
+            modifiee = True
+    return page if modifiee else dash.no_update
+
+def create_tableau_page():
+    """Crée la page du tableau principal (l'inspecteur est rempli par son propre callback)"""
+    completude = matrice_completude()
     
-    # Préparer les données pour le tableau Dash
-    table_data = []
-    for idx, tache in enumerate(LISTE_TACHES):
-        row = {'Tâche': tache}
-        for villa in LISTE_VILLAS:
-            row[villa] = df.at[tache, villa]
-        table_data.append(row)
+    nb_complets = sum(
+        int((completude.loc[tache] == len(get_types_docs_pour_tache(tache))).sum())
+        for tache in LISTE_TACHES
+    )
     
-    # Créer les colonnes avec style conditionnel - TÂCHES ALIGNÉES À GAUCHE
-    columns = [{'name': 'Tâche', 'id': 'Tâche', 'editable': False}]
-    for villa in LISTE_VILLAS:
-        columns.append({'name': villa, 'id': villa, 'editable': False})
+    # Créer les colonnes - VILLAS ALIGNÉES À GAUCHE, statut + documents sous chaque tâche
+    columns = [{'name': ['Villa', 'Villa'], 'id': 'Villa', 'editable': False}]
+    for (col_id, tache_idx), col_docs in zip(COLONNES_TACHES.items(), COLONNES_DOCS):
+        columns.append({'name': [LISTE_TACHES[tache_idx], 'Statut'], 'id': col_id, 'editable': False})
+        columns.append({'name': [LISTE_TACHES[tache_idx], '📄 Docs'], 'id': col_docs, 'editable': False})
     
     # Style conditionnel pour les cellules
     style_data_conditional = []
     
-    # Aligner les tâches à GAUCHE
+    # Aligner les villas à GAUCHE
     style_data_conditional.append({
-        'if': {'column_id': 'Tâche'},
+        'if': {'column_id': 'Villa'},
         'textAlign': 'left',
         'paddingLeft': '15px',
         'fontWeight': 'bold'
     })
     
-    for villa in LISTE_VILLAS:
-        for status, color in [('OK', '#d4edda'), ('Non Conforme', '#f8d7da'), 
-                              ('En cours', '#fff3cd'), ('À faire', '#ffffff')]:
+    # 4 règles par tâche, quel que soit le nombre de villas
+    for col_id in COLONNES_TACHES:
+        for status, color in COULEURS_STATUTS.items():
             style_data_conditional.append({
                 'if': {
-                    'filter_query': f'{{{villa}}} = "{status}"',
-                    'column_id': villa
+                    'filter_query': f'{{{col_id}}} = "{status}"',
+                    'column_id': col_id
                 },
                 'backgroundColor': color,
                 'fontWeight': 'bold' if status in ['OK', 'Non Conforme'] else 'normal'
             })
     
-    # Récupérer la tâche et villa sélectionnées - CORRECTION DU BUG
-    tache_idx = selected_cell.get('row', 0) if selected_cell else 0
-    villa_idx = selected_cell.get('column', 0) if selected_cell else 0
-    
-    # Vérifier que les index sont valides
-    if tache_idx >= len(LISTE_TACHES):
-        tache_idx = 0
-    if villa_idx >= len(LISTE_VILLAS):
-        villa_idx = 0
-        
-    tache_select = LISTE_TACHES[tache_idx]
-    villa_select = LISTE_VILLAS[villa_idx]
+    # Complétude : dossier complet en vert, dossier vide en rouge
+    for col_id, tache_idx in COLONNES_DOCS.items():
+        total = len(get_types_docs_pour_tache(LISTE_TACHES[tache_idx]))
+        style_data_conditional.append({
+            'if': {'filter_query': f'{{{col_id}}} = "{total}/{total}"', 'column_id': col_id},
+            'color': '#155724',
+            'fontWeight': 'bold'
+        })
+        style_data_conditional.append({
+            'if': {'filter_query': f'{{{col_id}}} = "0/{total}"', 'column_id': col_id},
+            'color': '#a94442'
+        })
     
     return html.Div([
         # Le tableau
         html.Div([
-            dbc.Alert("👇 Cliquez sur une case pour voir les détails en bas (scroll automatique).", color="info"),
+            dbc.Alert("👇 Cliquez sur une case pour voir les détails en bas (scroll automatique). "
+                      "Maj + clic sélectionne un bloc de cases pour leur appliquer un statut en une fois.", color="info"),
+            html.P(
+                f"📄 Dossiers documentaires complets : {nb_complets} / {len(LISTE_TACHES) * len(LISTE_VILLAS)}",
+                className="text-muted"
+            ),
+            dbc.Row([
+                dbc.Col(html.Label("📅 Statuts au :"), width="auto"),
+                dbc.Col(dcc.DatePickerSingle(
+                    id='date-historique',
+                    placeholder="Aujourd'hui",
+                    display_format='DD/MM/YYYY',
+                    first_day_of_week=1,
+                    max_date_allowed=datetime.now().date(),
+                    clearable=True
+                ), width="auto"),
+                dbc.Col(html.Div(id='historique-info')),
+                # Modification groupée des cases sélectionnées (mode édition)
+                dbc.Col(dbc.InputGroup([
+                    dbc.InputGroupText("✏️ Sélection"),
+                    dbc.Select(
+                        id='statut-lot',
+                        options=[{"label": statut, "value": statut} for statut in STATUTS],
+                        value="OK"
+                    ),
+                    dbc.Button("Appliquer", id='btn-appliquer-lot', color="success")
+                ], size="sm"), width="auto"),
+                dbc.Col(html.Div(id='lot-message'), width="auto")
+            ], align="center", className="mb-2"),
             dash_table.DataTable(
                 id='datatable-interactivity',
                 columns=columns,
-                data=table_data,
                 style_table={'overflowX': 'auto'},
                 style_cell={
                     'textAlign': 'center',
@@ -306,11 +2488,25 @@ def create_tableau_page(is_admin, selected_cell):
                     'fontWeight': 'bold',
                     'fontSize': '15px',
                     'color': '#1f77b4',
-                    'textAlign': 'center'
+                    'textAlign': 'center',
+                    'whiteSpace': 'normal',
+                    'height': 'auto'
                 },
                 style_data_conditional=style_data_conditional,
+                merge_duplicate_headers=True,
                 cell_selectable=True,
-                page_size=10
+                # Pagination, filtre et tri calculés en Python (update_grille) :
+                # chaque réponse ne contient que les villas de la page affichée
+                data=[],
+                page_action='custom',
+                page_current=0,
+                page_size=PAGE_TAILLE,
+                filter_action='custom',
+                filter_query='',
+                filter_options={'case': 'insensitive'},
+                sort_action='custom',
+                sort_mode='single',
+                sort_by=[]
             )
         ], id='table-container'),
         
@@ -318,15 +2514,46 @@ def create_tableau_page(is_admin, selected_cell):
         html.Div(id='inspecteur-ancre', style={'marginTop': '30px'}),
         
         # Zone de détails (Inspecteur)
-        html.Div([
-            create_inspecteur_box(tache_select, villa_select, is_admin)
-        ], id='inspecteur-box')
+        html.Div(id='inspecteur-box')
     ])
 
+# Inspecteur : re-rendu seul quand la sélection change, sans toucher au tableau
+@app.callback(
+    Output('inspecteur-box', 'children'),
+    [Input('selected-cell', 'data'),
+     Input('is-admin', 'data'),
+     Input('refresh-trigger', 'data')]
+)
+def update_inspecteur(selected_cell, is_admin, refresh):
+    # Rien à lire ni à construire tant qu'aucune case n'est sélectionnée
+    if not selected_cell:
+        return dbc.Alert("👆 Sélectionnez une case du tableau pour afficher ses documents.", color="light")
+    
+    # Récupérer la tâche et villa sélectionnées - CORRECTION DU BUG
+    tache_idx = selected_cell.get('row', 0)
+    villa_idx = selected_cell.get('column', 0)
+    
+    # Vérifier que les index sont valides
+    if tache_idx >= len(LISTE_TACHES):
+        tache_idx = 0
+    if villa_idx >= len(LISTE_VILLAS):
+        villa_idx = 0
+    
+    return create_inspecteur_box(LISTE_TACHES[tache_idx], LISTE_VILLAS[villa_idx], is_admin)
+
+def empreinte_case(tache, villa):
+    """Empreinte du statut et des documents d'une case : ce qu'affichent l'inspecteur et le dossier"""
+    documents = sorted(index_documents.fichiers(tache, villa).items())
+    return hashlib.sha1(repr((statut_case(tache, villa), documents)).encode()).hexdigest()[:16]
+
+def contenu_affiche(vue, tache, villa):
+    """Store rendu avec la vue : la synchronisation ne la recharge que si cette case a changé"""
+    return dcc.Store(id={'type': 'contenu-affiche', 'vue': vue},
+                     data={'tache': tache, 'villa': villa, 'empreinte': empreinte_case(tache, villa)})
+
 def create_inspecteur_box(tache, villa, is_admin):
     """Crée la boîte de détails avec documents"""
-    df = charger_donnees()
-    statut_actuel = df.at[tache, villa]
+    statut_actuel = statut_case(tache, villa)
     
     # Récupérer tous les fichiers existants
     fichiers_existants = get_tous_les_fichiers(tache, villa)
@@ -360,17 +2587,18 @@ def create_inspecteur_box(tache, villa, is_admin):
         
         if fichier_info:
             # Fichier existe - Afficher avec options
-            file_url_view = f"/download/{fichier_info['nom']}"
-            file_url_download = f"/download-file/{fichier_info['nom']}"
+            file_url_view = f"/download/{fichier_info['nom']}?v={fichier_info['version']}"
+            file_url_download = f"/download-file/{fichier_info['nom']}?v={fichier_info['version']}"
             
             card_content = [
                 html.H6(label, className="mb-2"),
                 dbc.Badge(f"✓ {fichier_info['nom']}", color="success", className="mb-2"),
                 html.Br(),
+                composant_apercu(fichier_info, file_url_view),
                 dbc.ButtonGroup([
                     dbc.Button(
                         "👁️ Voir", 
-                        id={'type': 'btn-view-doc', 'index': f"{tache}_{villa}_{type_doc}"},
+                        id=id_document('btn-view-doc', tache, villa, type_doc),
                         color="info", 
                         size="sm",
                         href=file_url_view,
@@ -378,7 +2606,7 @@ def create_inspecteur_box(tache, villa, is_admin):
                     ),
                     dbc.Button(
                         "📥 Télécharger", 
-                        id={'type': 'btn-download-doc', 'index': f"{tache}_{villa}_{type_doc}"},
+                        id=id_document('btn-download-doc', tache, villa, type_doc),
                         color="primary", 
                         size="sm",
                         href=file_url_download
@@ -389,19 +2617,10 @@ def create_inspecteur_box(tache, villa, is_admin):
             if is_admin:
                 card_content.append(
                     dbc.ButtonGroup([
-                        dcc.Upload(
-                            id={'type': 'upload-replace', 'index': f"{tache}_{villa}_{type_doc}"},
-                            children=dbc.Button(
-                                "🔄 Remplacer", 
-                                color="warning", 
-                                size="sm",
-                                className="me-1"
-                            ),
-                            multiple=False
-                        ),
+                        composant_upload(tache, villa, type_doc, "🔄 Remplacer", "warning", "me-1"),
                         dbc.Button(
                             "🗑️ Supprimer", 
-                            id={'type': 'btn-delete-doc', 'index': f"{tache}_{villa}_{type_doc}"},
+                            id=id_document('btn-delete-doc', tache, villa, type_doc),
                             color="danger", 
                             size="sm"
                         )
@@ -414,11 +2633,7 @@ def create_inspecteur_box(tache, villa, is_admin):
                     html.H6(label, className="mb-2"),
                     dbc.Badge("⚠️ Manquant", color="warning", className="mb-2"),
                     html.Br(),
-                    dcc.Upload(
-                        id={'type': 'upload-doc', 'index': f"{tache}_{villa}_{type_doc}"},
-                        children=dbc.Button("📤 Uploader", color="success", size="sm", className="w-100"),
-                        multiple=False
-                    )
+                    composant_upload(tache, villa, type_doc, "📤 Uploader", "success", "w-100")
                 ]
             else:
                 card_content = [
@@ -436,6 +2651,7 @@ def create_inspecteur_box(tache, villa, is_admin):
     
     return dbc.Card([
         dbc.CardBody([
+            contenu_affiche('inspecteur', tache, villa),
             html.H3("🔎 Détails & Documents", className="mb-3"),
             
             dbc.Row([
@@ -444,7 +2660,7 @@ def create_inspecteur_box(tache, villa, is_admin):
                     dbc.Select(
                         id='select-tache',
                         options=[{"label": t, "value": i} for i, t in enumerate(LISTE_TACHES)],
-                        value=LISTE_TACHES.index(tache)
+                        value=INDEX_TACHES[tache]
                     )
                 ], width=4),
                 dbc.Col([
@@ -452,7 +2668,7 @@ def create_inspecteur_box(tache, villa, is_admin):
                     dbc.Select(
                         id='select-villa',
                         options=[{"label": v, "value": i} for i, v in enumerate(LISTE_VILLAS)],
-                        value=LISTE_VILLAS.index(villa)
+                        value=INDEX_VILLAS[villa]
                     )
                 ], width=8)
             ], className="mb-3"),
@@ -483,6 +2699,152 @@ def create_dossier_page():
         dbc.Alert("Plans généraux, Permis, etc.", color="info")
     ])
 
+def carte_indicateur(titre, valeur, color):
+    return dbc.Col(dbc.Card(dbc.CardBody([
+        html.H6(titre, className="text-muted"),
+        html.H3(valeur, className=f"text-{color} mb-0")
+    ])), width=3)
+
+def create_analyse_page():
+    """Page d'analyse : agrégats calculés sur la matrice des statuts en cache"""
+    indicateurs = indicateurs_avancement()
+    par_tache = indicateurs['par_tache']
+    
+    lignes_taches = [
+        html.Tr([
+            html.Td(tache),
+            html.Td(dbc.Progress(value=round(ligne.taux * 100), label=f"{ligne.taux:.0%}", color="success",
+                                 style={'height': '20px', 'minWidth': '120px'})),
+            html.Td(int(ligne["En cours"])),
+            html.Td(int(ligne["Non Conforme"]), className="text-danger fw-bold" if ligne["Non Conforme"] else "")
+        ])
+        for tache, ligne in par_tache.iterrows()
+    ]
+    
+    if indicateurs['debit'] is None:
+        graphique_debit = dbc.Alert("Historique disponible uniquement avec le stockage SQLite", color="info")
+    elif not indicateurs['debit'].to_numpy().any():
+        graphique_debit = dbc.Alert(f"Aucun changement de statut depuis {SEMAINES_DEBIT} semaines", color="info")
+    else:
+        debit = indicateurs['debit']
+        semaines = [f"{semaine:%d/%m}" for semaine in debit.index]
+        graphique_debit = dcc.Graph(
+            figure={
+                'data': [
+                    {'type': 'bar', 'name': statut, 'x': semaines, 'y': debit[statut].tolist(),
+                     'marker': {'color': COULEURS_STATUTS[statut]}}
+                    for statut in debit.columns
+                ],
+                'layout': {'barmode': 'group', 'height': 280, 'margin': {'l': 40, 'r': 10, 't': 10, 'b': 40},
+                           'xaxis': {'title': 'Semaine du'}, 'legend': {'orientation': 'h'}}
+            },
+            config={'displayModeBar': False}
+        )
+    
+    duree_non_conforme = temps_non_conforme()
+    if duree_non_conforme is None:
+        tableau_non_conforme = dbc.Alert("Historique disponible uniquement avec le stockage SQLite", color="info")
+    elif duree_non_conforme.empty:
+        tableau_non_conforme = dbc.Alert("Aucun passage en Non Conforme journalisé ✅", color="success")
+    else:
+        tableau_non_conforme = dbc.Table([
+            html.Thead(html.Tr([html.Th("Tâche"), html.Th("Passages"), html.Th("Durée médiane"),
+                                html.Th("Plus longue"), html.Th("Encore ouverts")])),
+            html.Tbody([
+                html.Tr([
+                    html.Td(tache),
+                    html.Td(int(ligne.episodes)),
+                    html.Td(f"{ligne.mediane:.1f} j"),
+                    html.Td(f"{ligne.maximum:.1f} j"),
+                    html.Td(int(ligne.ouverts), className="text-danger fw-bold" if ligne.ouverts else "")
+                ])
+                for tache, ligne in duree_non_conforme.iterrows()
+            ])
+        ], bordered=True, hover=True, size="sm")
+    
+    return html.Div([
+        html.H2("📈 Analyse de l'avancement", className="mb-3"),
+        dbc.Row([
+            carte_indicateur("Tâches validées (OK)", f"{indicateurs['taux_global']:.1%}", "success"),
+            carte_indicateur("Villas terminées", f"{indicateurs['villas_terminees']} / {len(LISTE_VILLAS)}", "primary"),
+            carte_indicateur("Cases Non Conforme", int(par_tache["Non Conforme"].sum()), "danger"),
+            carte_indicateur("Cases en cours", int(par_tache["En cours"].sum()), "warning")
+        ], className="mb-4"),
+        
+        dbc.Row([
+            dbc.Col([
+                html.H5("📊 Avancement par tâche"),
+                dbc.Table([
+                    html.Thead(html.Tr([html.Th("Tâche"), html.Th("OK"), html.Th("En cours"), html.Th("Non Conforme")])),
+                    html.Tbody(lignes_taches)
+                ], bordered=True, hover=True, size="sm")
+            ], width=7),
+            dbc.Col([
+                html.H5("🏠 Villas par tranche d'avancement"),
+                dbc.Table([
+                    html.Tbody([
+                        html.Tr([html.Td(tranche), html.Td(int(nombre))])
+                        for tranche, nombre in indicateurs['tranches'].items()
+                    ])
+                ], bordered=True, size="sm")
+            ], width=5)
+        ], className="mb-4"),
+        
+        dbc.Row([
+            dbc.Col([
+                html.H5("🔥 Points chauds Non Conforme"),
+                dbc.ListGroup([
+                    dbc.ListGroupItem([villa, dbc.Badge(int(nombre), color="danger", className="ms-2")])
+                    for villa, nombre in indicateurs['points_chauds'].items()
+                ]) if not indicateurs['points_chauds'].empty else dbc.Alert("Aucune non-conformité ✅", color="success")
+            ], width=4),
+            dbc.Col([
+                html.H5("🐢 Villas les moins avancées"),
+                dbc.ListGroup([
+                    dbc.ListGroupItem([villa, dbc.Badge(f"{taux:.0%}", color="secondary", className="ms-2")])
+                    for villa, taux in indicateurs['villas_en_retard'].items()
+                ])
+            ], width=4),
+            dbc.Col([
+                html.H5(f"🚀 Changements par semaine ({SEMAINES_DEBIT} dernières)"),
+                graphique_debit
+            ], width=4)
+        ], className="mb-4"),
+        
+        dbc.Row([
+            dbc.Col([
+                html.H5("⏱️ Temps passé en Non Conforme"),
+                tableau_non_conforme
+            ], width=7)
+        ])
+    ])
+
+def create_recherche_page():
+    """Page de recherche plein texte dans les PDF (et leur tâche, villa, type)"""
+    if not index_texte.disponible:
+        return html.Div([
+            html.H2("🔎 Recherche dans les documents"),
+            dbc.Alert("Recherche indisponible : installer pypdfium2 (extraction du texte) "
+                      "et un SQLite avec FTS5.", color="warning")
+        ])
+    index_texte.rattraper()
+    indexes, total = depot_documents.couverture_texte()
+    return html.Div([
+        html.H2("🔎 Recherche dans les documents"),
+        html.P(f"📚 {indexes} / {total} document(s) indexé(s) — les PDF scannés sans texte n'apparaissent "
+               "que par leur tâche, villa ou type.", className="text-muted"),
+        dbc.Input(id='recherche-texte', type="search", debounce=True, className="mb-3",
+                  placeholder="Ex. : coffrage refusé, PV Villa 12, béton semelles…"),
+        html.Div(id='recherche-resultats')
+    ])
+
+def extrait_surligne(extrait):
+    """Extrait FTS5 -> composants, mots trouvés (entre \x02 et \x03) surlignés"""
+    morceaux = []
+    for i, morceau in enumerate(re.split("[\x02\x03]", extrait)):
+        morceaux.append(html.Mark(morceau) if i % 2 else morceau)
+    return morceaux
+
 def create_suivi_page(is_admin):
     """Page suivi de chaque tâche - AVEC UPLOAD"""
     return html.Div([
@@ -507,7 +2869,85 @@ def create_suivi_page(is_admin):
             ], width=6)
         ], className="mb-3"),
         
-        html.Div(id='folder-content')
+        html.Div(id='folder-content'),
+        
+        # Import groupé (admin only)
+        dbc.Card([
+            dbc.CardBody([
+                html.H5("📦 Import groupé", className="mb-2"),
+                html.P([
+                    "Déposez plusieurs PDF d'un coup. Chaque fichier est rangé d'après son nom : ",
+                    html.Code("T<tâche>_V<villa>_<type>.pdf"),
+                    " (ex. ", html.Code("T1_V12_PV_Archi.pdf"), ") ou le nom donné par l'application."
+                ], className="text-muted"),
+                html.Button("📦 Importer plusieurs PDF", className="btn btn-primary btn-sm",
+                            **{'data-upload-lot-url': '/upload-lot'})
+            ])
+        ], className="mt-3") if is_admin else html.Div(),
+        
+        # Vérification d'intégrité du dépôt (admin only)
+        dbc.Card([
+            dbc.CardBody([
+                html.H5("🩺 Vérification des documents", className="mb-2"),
+                html.P("Relit chaque PDF du dépôt et contrôle qu'il correspond à son empreinte SHA-256. "
+                       "La vérification tourne en arrière-plan.", className="text-muted"),
+                html.Button("🩺 Lancer la vérification", className="btn btn-outline-secondary btn-sm",
+                            **{'data-travail-url': '/travaux/verification'})
+            ])
+        ], className="mt-3") if is_admin else html.Div(),
+        
+        # PDF copiés à la main dans le dossier (admin only, seulement s'il y en a)
+        carte_rangement() if is_admin else html.Div()
+    ])
+
+def carte_rangement():
+    nombre = len(fichiers_a_ranger())
+    if not nombre:
+        return html.Div()
+    return dbc.Card([
+        dbc.CardBody([
+            html.H5("🗃️ Fichiers déposés à la main", className="mb-2"),
+            html.P([f"{nombre} PDF copié(s) directement dans ", html.Code(DOSSIER_FICHIERS),
+                    " attendent d'être rangés dans le dépôt. Les originaux sont ensuite déplacés dans ",
+                    html.Code(DOSSIER_IMPORTES), "."], className="text-muted"),
+            html.Button("🗃️ Ranger les fichiers", className="btn btn-outline-primary btn-sm",
+                        **{'data-travail-url': '/travaux/rangement'})
+        ])
+    ], className="mt-3")
+
+# Recherche plein texte : une requête FTS5, quelques millisecondes même sur des dizaines de milliers de PDF
+@app.callback(
+    Output('recherche-resultats', 'children'),
+    Input('recherche-texte', 'value'),
+    prevent_initial_call=True
+)
+def update_recherche(texte):
+    if not texte or not texte.strip():
+        return ""
+    debut = time.perf_counter()
+    resultats = index_texte.rechercher(texte)
+    duree = (time.perf_counter() - debut) * 1000
+    if not resultats:
+        return dbc.Alert(f"Aucun document ne contient « {texte.strip()} ».", color="light")
+    
+    elements = []
+    for tache, villa, type_doc, empreinte, extrait in resultats:
+        nom = nom_fichier_document(tache, villa, type_doc)
+        label = get_types_docs_pour_tache(tache).get(type_doc, type_doc)
+        elements.append(dbc.ListGroupItem([
+            html.Div([
+                html.Strong(f"{villa} · {tache}"),
+                dbc.Badge(label, color="secondary", className="ms-2"),
+                dbc.Button("👁️ Voir", href=f"/download/{nom}?v={empreinte}", target="_blank",
+                           external_link=True, color="info", size="sm", className="float-end")
+            ]),
+            html.Small(extrait_surligne(extrait), className="text-muted")
+        ]))
+    return html.Div([
+        html.P(f"{len(resultats)} résultat(s) en {duree:.1f} ms"
+               + (" (les plus pertinents)" if len(resultats) == RESULTATS_RECHERCHE else ""),
+               className="text-muted"),
+        dbc.ListGroup(elements)
     ])
 
 # Callback pour la sélection de cellule dans le tableau - CORRIGÉ
@@ -520,9 +2960,10 @@ def create_suivi_page(is_admin):
 def update_selected_cell(active_cell):
     if active_cell:
         col_id = active_cell['column_id']
-        if col_id != 'Tâche' and col_id in LISTE_VILLAS:  # VÉRIFICATION AJOUTÉE
-            row_idx = active_cell['row']
-            col_idx = LISTE_VILLAS.index(col_id)
+        if col_id in COLONNES_TACHES or col_id in COLONNES_DOCS:  # VÉRIFICATION AJOUTÉE
+            row_idx = COLONNES_TACHES.get(col_id, COLONNES_DOCS.get(col_id))
+            # row_id = index de la villa, indépendant de la page affichée
+            col_idx = active_cell.get('row_id', active_cell['row'])
             
             scroll_script = html.Script(
                 "setTimeout(function() { var elem = document.getElementById('inspecteur-ancre'); if(elem) elem.scrollIntoView({behavior: 'smooth', block: 'start'}); }, 100);"
@@ -544,119 +2985,205 @@ def update_from_selects(tache_idx, villa_idx):
         return {'row': int(tache_idx), 'column': int(villa_idx)}
     return dash.no_update
 
+# Pagination / filtre / tri côté serveur sur la grille en cache
+# Avec une date choisie, les statuts sont reconstruits depuis l'historique (documents : état actuel)
+@app.callback(
+    [Output('datatable-interactivity', 'data'),
+     Output('datatable-interactivity', 'page_count'),
+     Output('historique-info', 'children')],
+    [Input('datatable-interactivity', 'page_current'),
+     Input('datatable-interactivity', 'page_size'),
+     Input('datatable-interactivity', 'sort_by'),
+     Input('datatable-interactivity', 'filter_query'),
+     Input('date-historique', 'date'),
+     Input('btn-donnees-modifiees', 'n_clicks')]
+)
+def update_grille(page_current, page_size, sort_by, filter_query, date_historique, n_modifications=None):
+    if not date_historique:
+        return page_grille(page_current, page_size, sort_by, filter_query) + ("",)
+    
+    codes = statuts_a_la_date(date_historique)
+    if codes is None:
+        debut = cache_statuts.stockage.premiere_date()
+        message = (f"Historique disponible à partir du {datetime.fromtimestamp(debut):%d/%m/%Y}"
+                   if debut else "Historique disponible uniquement avec le stockage SQLite")
+        return [], 1, dbc.Badge(f"⚠️ {message}", color="warning")
+    jour = datetime.fromisoformat(date_historique)
+    info = dbc.Badge(f"🕒 État du {jour:%d/%m/%Y} (lecture seule pour les statuts)", color="secondary")
+    return page_grille(page_current, page_size, sort_by, filter_query, codes=codes) + (info,)
+
+# État de la page affichée, nécessaire pour retrouver une case dans la page
+ETAT_PAGE_GRILLE = [
+    State('datatable-interactivity', 'page_current'),
+    State('datatable-interactivity', 'page_size'),
+    State('datatable-interactivity', 'sort_by'),
+    State('datatable-interactivity', 'filter_query'),
+    State('date-historique', 'date')
+]
+
 # Callback pour sauvegarder le changement de statut - AVEC MESSAGE
+# Seule la case modifiée est renvoyée au navigateur (Patch), pas tout le tableau
 @app.callback(
-    [Output('refresh-trigger', 'data'),
-     Output('status-message', 'children')],
+    [Output('datatable-interactivity', 'data', allow_duplicate=True),
+     Output('status-message', 'children'),
+     Output('version-locale', 'data', allow_duplicate=True),
+     Output({'type': 'contenu-affiche', 'vue': ALL}, 'data')],
     [Input('btn-save-status', 'n_clicks')],
     [State('statut-radio', 'value'),
      State('selected-cell', 'data'),
      State('is-admin', 'data'),
-     State('refresh-trigger', 'data')],
+     State({'type': 'contenu-affiche', 'vue': ALL}, 'data')] + ETAT_PAGE_GRILLE,
     prevent_initial_call=True
 )
-def save_status(n_clicks, new_status, selected_cell, is_admin, current_refresh):
+def save_status(n_clicks, new_status, selected_cell, is_admin, affiches, *etat_page):
     if n_clicks and is_admin and selected_cell:
-        df = charger_donnees()
-        tache = LISTE_TACHES[selected_cell['row']]
-        villa = LISTE_VILLAS[selected_cell['column']]
-        df.at[tache, villa] = new_status
-        sauvegarder_donnees(df)
-        return current_refresh + 1, dbc.Alert("✅ Statut sauvegardé!", color="success", dismissable=True, duration=3000)
-    return dash.no_update, dash.no_update
+        tache_idx = selected_cell['row']
+        villa_idx = selected_cell['column']
+        sauvegarder_statut(LISTE_TACHES[tache_idx], LISTE_VILLAS[villa_idx], new_status)
+        
+        mise_a_jour = maj_cellule_grille(villa_idx, f"t{tache_idx}", new_status, *etat_page)
+        # Les vues de cette case affichent déjà ce statut : nouvelle empreinte sans les reconstruire
+        tache, villa = LISTE_TACHES[tache_idx], LISTE_VILLAS[villa_idx]
+        empreinte = empreinte_case(tache, villa)
+        affiches = [dict(affiche, empreinte=empreinte)
+                    if affiche and (affiche['tache'], affiche['villa']) == (tache, villa) else dash.no_update
+                    for affiche in affiches]
+        return (mise_a_jour, dbc.Alert("✅ Statut sauvegardé!", color="success", dismissable=True, duration=3000),
+                version_courante(), affiches)
+    return dash.no_update, dash.no_update, dash.no_update, [dash.no_update] * len(affiches)
+
+def valider_lot(selected_cells, statut):
+    """[(index tâche, index villa)] des cases de statut sélectionnées, ou ValueError si le lot est refusé"""
+    if statut not in STATUTS:
+        raise ValueError(f"statut inconnu : {statut}")
+    cases = []
+    for cellule in selected_cells or []:
+        # Les colonnes Villa et 📄 Docs d'un bloc sélectionné ne portent pas de statut
+        if cellule['column_id'] not in COLONNES_TACHES:
+            continue
+        villa_idx = cellule.get('row_id')
+        if not isinstance(villa_idx, int) or not 0 <= villa_idx < len(LISTE_VILLAS):
+            raise ValueError("sélection invalide, rechargez la page")
+        cases.append((COLONNES_TACHES[cellule['column_id']], villa_idx))
+    if not cases:
+        raise ValueError("aucune case de statut sélectionnée")
+    return cases
 
-# Callback UNIFIÉ pour uploader un document (nouveau ou remplacement) - TEMPS RÉEL
+# Statut appliqué à toutes les cases sélectionnées : lot validé en entier,
+# une seule écriture, et un seul Patch avec les cases modifiées de la page
 @app.callback(
-    Output('refresh-trigger', 'data', allow_duplicate=True),
-    [Input({'type': 'upload-doc', 'index': ALL}, 'contents'),
-     Input({'type': 'upload-replace', 'index': ALL}, 'contents'),
-     Input({'type': 'upload-folder', 'index': ALL}, 'contents')],
-    [State({'type': 'upload-doc', 'index': ALL}, 'filename'),
-     State({'type': 'upload-doc', 'index': ALL}, 'id'),
-     State({'type': 'upload-replace', 'index': ALL}, 'filename'),
-     State({'type': 'upload-replace', 'index': ALL}, 'id'),
-     State({'type': 'upload-folder', 'index': ALL}, 'filename'),
-     State({'type': 'upload-folder', 'index': ALL}, 'id'),
+    [Output('datatable-interactivity', 'data', allow_duplicate=True),
+     Output('lot-message', 'children'),
+     Output('refresh-trigger', 'data', allow_duplicate=True),
+     Output('version-locale', 'data', allow_duplicate=True)],
+    Input('btn-appliquer-lot', 'n_clicks'),
+    [State('datatable-interactivity', 'selected_cells'),
+     State('statut-lot', 'value'),
      State('is-admin', 'data'),
-     State('refresh-trigger', 'data')],
+     State('selected-cell', 'data'),
+     State('refresh-trigger', 'data')] + ETAT_PAGE_GRILLE,
     prevent_initial_call=True
 )
-def upload_file_unified(contents_new, contents_replace, contents_folder,
-                       filenames_new, ids_new, filenames_replace, ids_replace,
-                       filenames_folder, ids_folder, is_admin, current_refresh):
+def appliquer_statut_lot(n_clicks, selected_cells, statut, is_admin, selected_cell, current_refresh, *etat_page):
+    def refus(message):
+        return dash.no_update, dbc.Badge(message, color="warning"), dash.no_update, dash.no_update
+    
     if not is_admin:
-        return dash.no_update
+        return refus("🔒 Mode édition requis")
+    if etat_page[-1]:
+        return refus("🕒 Statuts passés en lecture seule")
+    try:
+        cases = valider_lot(selected_cells, statut)
+    except ValueError as erreur:
+        return refus(f"⚠️ {erreur}")
     
-    # Combiner toutes les sources d'upload
-    all_uploads = []
-    
-    if contents_new:
-        for i, content in enumerate(contents_new):
-            if content:
-                all_uploads.append((content, filenames_new[i], ids_new[i]['index']))
-    
-    if contents_replace:
-        for i, content in enumerate(contents_replace):
-            if content:
-                all_uploads.append((content, filenames_replace[i], ids_replace[i]['index']))
-    
-    if contents_folder:
-        for i, content in enumerate(contents_folder):
-            if content:
-                all_uploads.append((content, filenames_folder[i], ids_folder[i]['index']))
-    
-    # Traiter tous les uploads
-    for content, filename, index in all_uploads:
-        # Parser l'index pour extraire tâche, villa, type_doc
-        for tache in LISTE_TACHES:
-            if index.startswith(tache):
-                reste = index[len(tache)+1:]
-                for villa in LISTE_VILLAS:
-                    if reste.startswith(villa):
-                        type_doc = reste[len(villa)+1:]
-                        sauvegarder_fichier(content, filename, tache, villa, type_doc)
-                        return current_refresh + 1
+    sauvegarder_statuts([(LISTE_TACHES[t], LISTE_VILLAS[v], statut) for t, v in cases])
+    mise_a_jour = maj_cellules_grille([(v, f"t{t}", statut) for t, v in cases], *etat_page)
+    # L'inspecteur affiche peut-être une des cases modifiées
+    inspecteur_modifie = bool(selected_cell) and (selected_cell['row'], selected_cell['column']) in cases
+    message = dbc.Badge(f"✅ {len(cases)} case(s) → {statut}", color="success")
+    return (mise_a_jour, message, (current_refresh or 0) + 1 if inspecteur_modifie else dash.no_update,
+            version_courante())
+
+# Après un upload ou une suppression depuis l'inspecteur, seule la case de
+# complétude de la cellule sélectionnée est mise à jour dans le tableau
+@app.callback(
+    Output('datatable-interactivity', 'data', allow_duplicate=True),
+    Input('refresh-trigger', 'data'),
+    [State('selected-cell', 'data')] + ETAT_PAGE_GRILLE,
+    prevent_initial_call=True
+)
+def update_completude_cellule(refresh, selected_cell, *etat_page):
+    if not selected_cell:
+        return dash.no_update
+    tache_idx = selected_cell['row']
+    villa_idx = selected_cell['column']
+    tache = LISTE_TACHES[tache_idx]
+    nb_presents = len(index_documents.fichiers(tache, LISTE_VILLAS[villa_idx]))
     
-    return dash.no_update
+    return maj_cellule_grille(villa_idx, f"d{tache_idx}", libelle_completude(nb_presents, tache), *etat_page)
 
-# Callback pour supprimer un document - TEMPS RÉEL
+# Callback UNIFIÉ après un upload (nouveau ou remplacement) - TEMPS RÉEL
+# Le fichier est déjà écrit par la route /upload : il ne reste qu'à rafraîchir
 @app.callback(
     Output('refresh-trigger', 'data', allow_duplicate=True),
-    [Input({'type': 'btn-delete-doc', 'index': ALL}, 'n_clicks'),
-     Input({'type': 'btn-delete-folder', 'index': ALL}, 'n_clicks')],
-    [State({'type': 'btn-delete-doc', 'index': ALL}, 'id'),
-     State({'type': 'btn-delete-folder', 'index': ALL}, 'id'),
-     State('is-admin', 'data'),
+    Input('btn-upload-termine', 'n_clicks'),
+    [State('is-admin', 'data'),
      State('refresh-trigger', 'data')],
     prevent_initial_call=True
 )
-def delete_file_unified(n_clicks_list, n_clicks_folder, ids_list, ids_folder, is_admin, current_refresh):
-    if not is_admin:
+def upload_file_unified(n_clicks, is_admin, current_refresh):
+    if not is_admin or not n_clicks:
         return dash.no_update
+    return current_refresh + 1
+
+# Modification venue d'un autre poste : inspecteur, dossier et complétude sont rafraîchis seulement
+# si la case affichée a changé, sans écraser une saisie en cours sur une autre case
+# (la page du tableau est renvoyée par update_grille)
+@app.callback(
+    Output('refresh-trigger', 'data', allow_duplicate=True),
+    Input('btn-donnees-modifiees', 'n_clicks'),
+    [State('refresh-trigger', 'data'),
+     State({'type': 'contenu-affiche', 'vue': ALL}, 'data')],
+    prevent_initial_call=True
+)
+def synchro_donnees(n_clicks, current_refresh, affiches):
+    if not n_clicks:
+        return dash.no_update
+    if all(empreinte_case(affiche['tache'], affiche['villa']) == affiche['empreinte']
+           for affiche in affiches if affiche):
+        return dash.no_update
+    return current_refresh + 1
+
+# La version renvoyée par une écriture de ce navigateur devient sa dernière version connue
+app.clientside_callback(
+    ClientsideFunction(namespace='noria', function_name='versionConnue'),
+    # Sortie factice : la fonction ne fait que prévenir la synchronisation
+    Output('version-locale', 'clear_data'),
+    Input('version-locale', 'data'),
+    prevent_initial_call=True
+)
+
+# Callback pour supprimer un document - TEMPS RÉEL
+@app.callback(
+    [Output('refresh-trigger', 'data', allow_duplicate=True),
+     Output('version-locale', 'data', allow_duplicate=True)],
+    [Input({'type': 'btn-delete-doc', 'tache': ALL, 'villa': ALL, 'doc': ALL}, 'n_clicks'),
+     Input({'type': 'btn-delete-folder', 'tache': ALL, 'villa': ALL, 'doc': ALL}, 'n_clicks')],
+    [State('is-admin', 'data'),
+     State('refresh-trigger', 'data')],
+    prevent_initial_call=True
+)
+def delete_file_unified(n_clicks_list, n_clicks_folder, is_admin, current_refresh):
+    # Seul le bouton qui a déclenché le callback est traité, pas tous les ALL
+    # (l'apparition de nouveaux boutons déclenche aussi le callback, avec n_clicks vide)
+    if not is_admin or not ctx.triggered_id or not ctx.triggered[0]['value']:
+        return dash.no_update, dash.no_update
     
-    all_clicks = []
-    
-    if n_clicks_list:
-        for i, n_clicks in enumerate(n_clicks_list):
-            if n_clicks:
-                all_clicks.append(ids_list[i]['index'])
-    
-    if n_clicks_folder:
-        for i, n_clicks in enumerate(n_clicks_folder):
-            if n_clicks:
-                all_clicks.append(ids_folder[i]['index'])
-    
-    for index in all_clicks:
-        for tache in LISTE_TACHES:
-            if index.startswith(tache):
-                reste = index[len(tache)+1:]
-                for villa in LISTE_VILLAS:
-                    if reste.startswith(villa):
-                        type_doc = reste[len(villa)+1:]
-                        if supprimer_fichier(tache, villa, type_doc):
-                            return current_refresh + 1
-    
-    return dash.no_update
+    document = decoder_id_document(ctx.triggered_id)
+    if document and supprimer_fichier(*document):
+        return current_refresh + 1, version_courante()
+    return dash.no_update, dash.no_update
 
 # Callback pour la page de suivi - AVEC TOUTES LES FONCTIONNALITÉS
 @app.callback(
@@ -667,8 +3194,7 @@ def delete_file_unified(n_clicks_list, n_clicks_folder, ids_list, ids_folder, is
     [State('is-admin', 'data')]
 )
 def update_folder_content(tache, villa, refresh, is_admin):
-    df = charger_donnees()
-    statut = df.at[tache, villa]
+    statut = statut_case(tache, villa)
     
     # Récupérer les documents
     fichiers_existants = get_tous_les_fichiers(tache, villa)
@@ -678,8 +3204,8 @@ def update_folder_content(tache, villa, refresh, is_admin):
     for type_doc, label in types_docs.items():
         fichier_info = fichiers_existants.get(type_doc)
         if fichier_info:
-            file_url_view = f"/download/{fichier_info['nom']}"
-            file_url_download = f"/download-file/{fichier_info['nom']}"
+            file_url_view = f"/download/{fichier_info['nom']}?v={fichier_info['version']}"
+            file_url_download = f"/download-file/{fichier_info['nom']}?v={fichier_info['version']}"
             
             # Boutons de base
             buttons = [
@@ -690,14 +3216,10 @@ def update_folder_content(tache, villa, refresh, is_admin):
             # Boutons admin
             if is_admin:
                 buttons.extend([
-                    dcc.Upload(
-                        id={'type': 'upload-folder', 'index': f"{tache}_{villa}_{type_doc}"},
-                        children=dbc.Button("🔄 Remplacer", color="warning", size="sm", className="me-1"),
-                        multiple=False
-                    ),
+                    composant_upload(tache, villa, type_doc, "🔄 Remplacer", "warning", "me-1"),
                     dbc.Button(
                         "🗑️ Supprimer",
-                        id={'type': 'btn-delete-folder', 'index': f"{tache}_{villa}_{type_doc}"},
+                        id=id_document('btn-delete-folder', tache, villa, type_doc),
                         color="danger",
                         size="sm"
                     )
@@ -709,7 +3231,8 @@ def update_folder_content(tache, villa, refresh, is_admin):
                         dbc.Col([
                             html.Strong(label),
                             html.Br(),
-                            html.Small(fichier_info['nom'], className="text-muted")
+                            html.Small(fichier_info['nom'], className="text-muted"),
+                            composant_apercu(fichier_info, file_url_view)
                         ], width=4),
                         dbc.Col([
                             dbc.ButtonGroup(buttons, className="float-end")
@@ -728,11 +3251,7 @@ def update_folder_content(tache, villa, refresh, is_admin):
                                 dbc.Badge("⚠️ Manquant", color="warning", className="ms-2")
                             ], width=6),
                             dbc.Col([
-                                dcc.Upload(
-                                    id={'type': 'upload-folder', 'index': f"{tache}_{villa}_{type_doc}"},
-                                    children=dbc.Button("📤 Uploader", color="success", size="sm", className="float-end"),
-                                    multiple=False
-                                )
+                                composant_upload(tache, villa, type_doc, "📤 Uploader", "success", "float-end")
                             ], width=6)
                         ])
                     ])
@@ -745,11 +3264,22 @@ def update_folder_content(tache, villa, refresh, is_admin):
                     ])
                 )
     
+    # external_link : lien de téléchargement, pas une navigation interne
+    exports = dbc.ButtonGroup([
+        dbc.Button(f"📦 ZIP {villa}", href=f"/export/villa/{INDEX_VILLAS[villa]}.zip",
+                   external_link=True, color="secondary", outline=True, size="sm"),
+        dbc.Button("📦 ZIP de la tâche", href=f"/export/tache/{INDEX_TACHES[tache]}.zip",
+                   external_link=True, color="secondary", outline=True, size="sm"),
+        dbc.Button("📦 ZIP du projet", href="/export/projet.zip",
+                   external_link=True, color="secondary", outline=True, size="sm")
+    ], className="float-end")
+    
     return html.Div([
+        contenu_affiche('dossier', tache, villa),
         html.H3(f"📂 {tache} > {villa}", className="mb-3"),
         dbc.Card([
             dbc.CardBody([
-                html.H5("📄 Documents disponibles", className="mb-3"),
+                html.Div([exports, html.H5("📄 Documents disponibles", className="mb-3")]),
                 dbc.ListGroup(docs_list) if docs_list else dbc.Alert("Aucun document configuré", color="info")
             ])
         ], className="mb-3"),
@@ -763,4 +3293,13 @@ def update_folder_content(tache, villa, refresh, is_admin):
 # =====================================================
 
 if __name__ == '__main__':
+    if "--ranger" in sys.argv:
+        # Rangement des PDF déposés à la main, une fois, sans lancer le serveur. L'extraction du
+        # texte reste en file pour les workers du serveur
+        travaux.travailleurs = 0
+        resume = ranger_fichiers_deposes(lambda progression, message: print(message))
+        for erreur in resume['erreurs']:
+            print(f"⚠️ {erreur['fichier']} : {erreur['raison']}")
+        apercus.arreter()
+        sys.exit(1 if resume['erreurs'] else 0)
     app.run(debug=True, host='0.0.0.0', port=8050)
\ No newline at end of file
@@ -0,0 +1,65 @@
+// Synchronisation entre postes : /version est sondée à intervalle régulier
+// (réponse 304 tant que rien ne change, via l'ETag). Quand la version bouge,
+// on clique le bouton caché 'btn-donnees-modifiees' et Dash recharge la page
+// du tableau et l'inspecteur ; sinon aucun callback n'est déclenché.
+// Les écritures de ce navigateur renvoient la version qui les suit
+// (versionConnue) : elles ne sont pas prises pour celles d'un autre poste.
+(function () {
+    var derniereVersion = null;
+    // Incrémentée à chaque version connue : une réponse partie avant est ignorée
+    var generation = 0;
+
+    function versionConnue(version) {
+        if (version) {
+            derniereVersion = version;
+            generation += 1;
+        }
+    }
+
+    function sonder() {
+        var bouton = document.getElementById('btn-donnees-modifiees');
+        if (!bouton || document.hidden) {
+            return;
+        }
+        var depart = generation;
+        fetch(bouton.dataset.versionUrl, {cache: 'no-cache'}).then(function (reponse) {
+            return reponse.ok ? reponse.json() : null;
+        }).then(function (resultat) {
+            if (!resultat || depart !== generation) {
+                return;
+            }
+            if (derniereVersion !== null && resultat.version !== derniereVersion) {
+                bouton.click();
+            }
+            derniereVersion = resultat.version;
+        }).catch(function () {
+            // Serveur momentanément injoignable : nouvel essai au prochain tour
+        });
+    }
+
+    function demarrer() {
+        var bouton = document.getElementById('btn-donnees-modifiees');
+        if (!bouton) {
+            // Layout Dash pas encore rendu
+            setTimeout(demarrer, 500);
+            return;
+        }
+        sonder();
+        setInterval(sonder, parseInt(bouton.dataset.intervalleMs, 10) || 5000);
+        // Retour sur l'onglet : rattrapage immédiat
+        document.addEventListener('visibilitychange', sonder);
+    }
+
+    window.noriaSynchro = {versionConnue: versionConnue};
+    // Appelée par le callback client de 'version-locale' après une écriture Dash
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        noria: {
+            versionConnue: function (version) {
+                versionConnue(version);
+                return window.dash_clientside.no_update;
+            }
+        }
+    });
+
+    document.addEventListener('DOMContentLoaded', demarrer);
+})();
@@ -0,0 +1,187 @@
+// Upload des documents sans passer par dcc.Upload :
+// les fichiers sont envoyés en multipart à la route indiquée par
+// data-upload-url (un document) ou data-upload-lot-url (import groupé).
+// Le serveur répond tout de suite (202) et range les fichiers en arrière-plan :
+// on suit le travail sur /travaux/<id>, puis on clique le bouton caché
+// 'btn-upload-termine' pour que Dash rafraîchisse la vue.
+var INTERVALLE_SUIVI_MS = 500;
+
+// Sonde l'URL de suivi jusqu'à la fin du travail ; résolu avec son résultat
+function suivreTravail(url, progression) {
+    return new Promise(function (resoudre, rejeter) {
+        function sonder() {
+            fetch(url, {cache: 'no-store'}).then(function (reponse) {
+                return reponse.json();
+            }).then(function (travail) {
+                if (travail.etat === 'termine') {
+                    resoudre(travail.resultat);
+                } else if (travail.etat === 'erreur' || travail.erreur) {
+                    rejeter(new Error(travail.message || travail.erreur));
+                } else {
+                    if (progression) {
+                        progression(travail);
+                    }
+                    setTimeout(sonder, INTERVALLE_SUIVI_MS);
+                }
+            }).catch(rejeter);
+        }
+        sonder();
+    });
+}
+
+// POST d'un formulaire puis suivi du travail créé par le serveur
+function lancerTravail(url, donnees, progression) {
+    var motDePasse = document.getElementById('password-input');
+    return fetch(url, {
+        method: 'POST',
+        headers: {'X-Noria-Admin': motDePasse ? motDePasse.value : ''},
+        body: donnees
+    }).then(function (reponse) {
+        return reponse.json().then(function (resultat) {
+            if (!reponse.ok) {
+                throw new Error(resultat.erreur || reponse.statusText);
+            }
+            return suivreTravail(resultat.suivi, progression);
+        });
+    });
+}
+
+// Le résultat d'un travail qui écrit porte la version d'après l'écriture :
+// la synchronisation ne la prend pas pour la modification d'un autre poste
+function rafraichirVue(resultat) {
+    if (resultat.version && window.noriaSynchro) {
+        window.noriaSynchro.versionConnue(resultat.version);
+    }
+    var termine = document.getElementById('btn-upload-termine');
+    if (termine) {
+        termine.click();
+    }
+}
+
+function envoyerFichier(bouton, fichier) {
+    var donnees = new FormData();
+    donnees.append('fichier', fichier);
+    bouton.disabled = true;
+
+    lancerTravail(bouton.dataset.uploadUrl, donnees).then(function (resultat) {
+        if (resultat.erreurs.length) {
+            throw new Error(resultat.erreurs[0].raison);
+        }
+        rafraichirVue(resultat);
+    }).catch(function (erreur) {
+        alert('❌ Upload impossible : ' + erreur.message);
+    }).finally(function () {
+        bouton.disabled = false;
+    });
+}
+
+// Résumé d'un import groupé, d'un rangement ou d'une vérification, affiché hors de l'arbre React de Dash
+function afficherResume(resultat) {
+    var lignes;
+    if (resultat.verifies !== undefined) {
+        lignes = ['✅ ' + resultat.verifies + ' document(s) vérifié(s)'];
+    } else if (resultat.ranges !== undefined) {
+        lignes = ['✅ ' + resultat.ranges + ' fichier(s) rangé(s) dans le dépôt'];
+    } else {
+        lignes = ['✅ ' + resultat.enregistres.length + ' fichier(s) enregistré(s)'];
+    }
+    (resultat.ignores || []).concat(resultat.erreurs).forEach(function (item) {
+        lignes.push('⚠️ ' + item.fichier + ' : ' + item.raison);
+    });
+    var alerte = document.createElement('div');
+    alerte.className = 'alert alert-info position-fixed bottom-0 end-0 m-3 shadow';
+    alerte.style.zIndex = 2000;
+    alerte.style.maxHeight = '50vh';
+    alerte.style.overflowY = 'auto';
+    alerte.style.whiteSpace = 'pre-line';
+    alerte.title = 'Cliquer pour fermer';
+    alerte.textContent = lignes.join('\n');
+    alerte.addEventListener('click', function () { alerte.remove(); });
+    document.body.appendChild(alerte);
+}
+
+// Avancement d'un travail long (message publié par le serveur), hors de l'arbre React
+function afficherProgression(travail) {
+    var zone = document.getElementById('noria-progression');
+    if (!zone) {
+        zone = document.createElement('div');
+        zone.id = 'noria-progression';
+        zone.className = 'alert alert-secondary position-fixed bottom-0 start-0 m-3 shadow';
+        zone.style.zIndex = 2000;
+        document.body.appendChild(zone);
+    }
+    zone.textContent = '⏳ ' + (travail.message || 'En attente…') + ' (' + Math.round(travail.progression * 100) + ' %)';
+}
+
+function masquerProgression() {
+    var zone = document.getElementById('noria-progression');
+    if (zone) {
+        zone.remove();
+    }
+}
+
+function envoyerLot(bouton, fichiers) {
+    var donnees = new FormData();
+    Array.prototype.forEach.call(fichiers, function (fichier) {
+        donnees.append('fichiers', fichier);
+    });
+    bouton.disabled = true;
+
+    lancerTravail(bouton.dataset.uploadLotUrl, donnees, afficherProgression).then(function (resultat) {
+        afficherResume(resultat);
+        rafraichirVue(resultat);
+    }).catch(function (erreur) {
+        alert('❌ Import impossible : ' + erreur.message);
+    }).finally(function () {
+        masquerProgression();
+        bouton.disabled = false;
+    });
+}
+
+// Travail d'administration sans fichier (vérification, rangement des fichiers déposés à la main)
+function lancerTravailAdmin(bouton) {
+    bouton.disabled = true;
+    lancerTravail(bouton.dataset.travailUrl, new FormData(), afficherProgression).then(function (resultat) {
+        afficherResume(resultat);
+        rafraichirVue(resultat);
+    }).catch(function (erreur) {
+        alert('❌ Travail impossible : ' + erreur.message);
+    }).finally(function () {
+        masquerProgression();
+        bouton.disabled = false;
+    });
+}
+
+// Sélecteur de fichier temporaire, hors de l'arbre React de Dash
+function choisirFichiers(multiple, rappel) {
+    var input = document.createElement('input');
+    input.type = 'file';
+    input.accept = '.pdf,application/pdf';
+    input.multiple = multiple;
+    input.addEventListener('change', function () {
+        if (input.files && input.files.length > 0) {
+            rappel(input.files);
+        }
+    });
+    input.click();
+}
+
+document.addEventListener('click', function (event) {
+    if (!event.target.closest) {
+        return;
+    }
+    var bouton = event.target.closest('[data-upload-url]');
+    if (bouton) {
+        choisirFichiers(false, function (fichiers) { envoyerFichier(bouton, fichiers[0]); });
+        return;
+    }
+    var boutonLot = event.target.closest('[data-upload-lot-url]');
+    if (boutonLot) {
+        choisirFichiers(true, function (fichiers) { envoyerLot(boutonLot, fichiers); });
+        return;
+    }
+    var boutonTravail = event.target.closest('[data-travail-url]');
+    if (boutonTravail && !boutonTravail.disabled) {
+        lancerTravailAdmin(boutonTravail);
+    }
+});
@@ -0,0 +1,348 @@
+"""Benchmarks reproductibles du tableau de bord Noria.
+
+Exécute les vraies fonctions de app.py (sans navigateur) sur des projets
+synthétiques et enregistre latences, taille des réponses et pic mémoire en JSON.
+
+    python bench_noria.py --villas 108 500 2000 --fichiers 0 100000 --sortie bench.json
+    python bench_noria.py --reference bench_v1.json --sortie bench_v2.json
+    python bench_noria.py --villas 2000 --taches 40 --fichiers 0
+
+Chaque PDF demandé devient un document du dépôt (un emplacement tâche x villa x type) :
+si le schéma n'en offre pas assez, des tâches sont ajoutées jusqu'à en avoir assez
+(100 000 PDF sur 108 villas : environ 460 tâches). Tous partagent le même contenu,
+rangé une seule fois : aperçus et extraction de texte ne faussent pas les mesures.
+
+Chaque scénario tourne dans un sous-processus, dans un dossier temporaire :
+app.py lit sa configuration (schéma, stockage, dossier des fichiers) à l'import.
+"""
+import argparse
+import ast
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+DOSSIER_APP = os.path.dirname(os.path.abspath(__file__))
+TAILLE_UPLOAD = 1024 * 1024
+
+# =====================================================
+# PRÉPARATION D'UN PROJET SYNTHÉTIQUE
+# =====================================================
+
+def pdf_minimal(texte, remplissage=0):
+    """PDF valide d'une page (texte en Helvetica), avec xref calculée ; remplissage : octets
+    aléatoires dans un flux non référencé, pour atteindre la taille d'un vrai plan scanné"""
+    contenu = f"BT /F1 12 Tf 50 750 Td ({texte}) Tj ET".encode('latin-1')
+    objets = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R"
+        b" /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(contenu), contenu),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    if remplissage:
+        objets.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (remplissage, os.urandom(remplissage)))
+    sortie = b"%PDF-1.4\n"
+    positions = []
+    for numero, objet in enumerate(objets, 1):
+        positions.append(len(sortie))
+        sortie += b"%d 0 obj\n%s\nendobj\n" % (numero, objet)
+    xref = len(sortie)
+    sortie += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objets) + 1)
+    sortie += b"".join(b"%010d 00000 n \n" % position for position in positions)
+    sortie += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objets) + 1, xref)
+    return sortie
+
+CONTENU_PDF = pdf_minimal("Document de chantier Noria")
+
+def schema_par_defaut():
+    """SCHEMA_PAR_DEFAUT lu dans le source de app.py, sans l'importer (l'import figerait la configuration)"""
+    with open(os.path.join(DOSSIER_APP, "app.py"), encoding="utf-8") as f:
+        module = ast.parse(f.read())
+    for noeud in module.body:
+        if isinstance(noeud, ast.Assign) and any(getattr(c, 'id', None) == "SCHEMA_PAR_DEFAUT" for c in noeud.targets):
+            return ast.literal_eval(noeud.value)
+    raise RuntimeError("SCHEMA_PAR_DEFAUT introuvable dans app.py")
+
+def ecrire_schema(dossier, nb_villas, nb_taches=None):
+    """Schéma par défaut de l'app, avec le nombre de villas (et éventuellement de tâches) demandé"""
+    schema = dict(schema_par_defaut(), villas={"prefixe": "Villa", "nombre": nb_villas})
+    if nb_taches:
+        # Tâches supplémentaires calquées sur celles du schéma, en boucle
+        modeles = schema["taches"]
+        schema["taches"] = [
+            dict(modeles[i % len(modeles)], nom=f"{i + 1}. Tâche {i + 1}") for i in range(nb_taches)
+        ]
+    chemin = os.path.join(dossier, "projet.json")
+    with open(chemin, "w", encoding="utf-8") as f:
+        json.dump(schema, f, ensure_ascii=False)
+    return chemin
+
+def taches_pour_fichiers(nb_villas, nb_fichiers, nb_taches=None):
+    """Nombre de tâches (au moins nb_taches) offrant un emplacement à chacun des nb_fichiers documents,
+    ou None si le schéma par défaut suffit"""
+    modeles = schema_par_defaut()["taches"]
+    # Tâche sans documents déclarés : un seul type (DOCS_PAR_DEFAUT)
+    par_tache = [nb_villas * len(modele.get("documents", {"Document": ""})) for modele in modeles]
+    nombre = nb_taches or len(modeles)
+    while sum(par_tache[i % len(modeles)] for i in range(nombre)) < nb_fichiers:
+        nombre += 1
+    if nb_taches is None and nombre == len(modeles):
+        return None
+    return nombre
+
+def peupler(app, nb_fichiers, alea):
+    """Statuts aléatoires + nb_fichiers documents répartis au hasard sur les emplacements du schéma"""
+    df = app.charger_donnees()
+    valeurs = [[alea.choice(app.STATUTS) for _ in app.LISTE_VILLAS] for _ in app.LISTE_TACHES]
+    df.loc[:, :] = valeurs
+    app.sauvegarder_donnees(df)
+
+    attendus = [
+        app.nom_fichier_document(tache, villa, type_doc)
+        for tache in app.LISTE_TACHES
+        for type_doc in app.get_types_docs_pour_tache(tache)
+        for villa in app.LISTE_VILLAS
+    ]
+    if nb_fichiers > len(attendus):
+        raise ValueError(f"{nb_fichiers} fichiers pour {len(attendus)} emplacements (voir taches_pour_fichiers)")
+    alea.shuffle(attendus)
+    for nom in attendus[:nb_fichiers]:
+        with open(os.path.join(app.DOSSIER_FICHIERS, nom), "wb") as f:
+            f.write(CONTENU_PDF)
+    # Les PDF déposés passent dans le dépôt comme une installation existante migrée
+    resume = app.ranger_fichiers_deposes(lambda progression, message: None)
+    assert resume['ranges'] == nb_fichiers and not resume['erreurs'], resume
+
+# =====================================================
+# MESURES
+# =====================================================
+
+def taille_reponse(resultat):
+    """Octets qu'enverrait Dash pour ce résultat de callback"""
+    import plotly
+    try:
+        return len(json.dumps(resultat, cls=plotly.utils.PlotlyJSONEncoder).encode())
+    except TypeError:
+        return None
+
+def percentile(valeurs, p):
+    valeurs = sorted(valeurs)
+    rang = min(len(valeurs) - 1, max(0, round(p / 100 * (len(valeurs) - 1))))
+    return valeurs[rang]
+
+def mesurer(operation, repetitions):
+    """Latences (ms), taille de la dernière réponse et pic mémoire d'une opération"""
+    operation()  # échauffement (caches, imports paresseux)
+    durees = []
+    resultat = None
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        resultat = operation()
+        durees.append((time.perf_counter() - debut) * 1000)
+
+    # Pic mémoire mesuré à part : tracemalloc fausserait les latences
+    tracemalloc.start()
+    operation()
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'p50_ms': round(percentile(durees, 50), 3),
+        'p95_ms': round(percentile(durees, 95), 3),
+        'p99_ms': round(percentile(durees, 99), 3),
+        'max_ms': round(max(durees), 3),
+        'octets': taille_reponse(resultat),
+        'pic_memoire_ko': round(pic / 1024, 1)
+    }
+
+def operations(app, alea):
+    """Opérations mesurées : callbacks et chemins de stockage, avec des arguments réalistes"""
+    client = app.server.test_client()
+    contenu_upload = pdf_minimal("Plan bench", TAILLE_UPLOAD - 1024)
+    etat_page = (0, app.PAGE_TAILLE, [], '', None)
+
+    def cellule():
+        return alea.randrange(len(app.LISTE_TACHES)), alea.randrange(len(app.LISTE_VILLAS))
+
+    def inspecteur():
+        t, v = cellule()
+        return app.create_inspecteur_box(app.LISTE_TACHES[t], app.LISTE_VILLAS[v], True)
+
+    def dossier():
+        t, v = cellule()
+        return app.update_folder_content(app.LISTE_TACHES[t], app.LISTE_VILLAS[v], 0, True)
+
+    def statut():
+        t, v = cellule()
+        return app.save_status(1, alea.choice(app.STATUTS), {'row': t, 'column': v}, True, [], *etat_page)[0]
+
+    def statut_lot():
+        # Bloc de 12 villas x 1 tâche sélectionné dans la page affichée
+        t = alea.randrange(len(app.LISTE_TACHES))
+        cases = [{'row': v, 'column': 2 * t + 1, 'column_id': f"t{t}", 'row_id': v}
+                 for v in range(min(12, len(app.LISTE_VILLAS)))]
+        return app.appliquer_statut_lot(1, cases, alea.choice(app.STATUTS), True, None, 0, *etat_page)[0]
+
+    def upload():
+        t, v = cellule()
+        type_doc = alea.choice(list(app.get_types_docs_pour_tache(app.LISTE_TACHES[t])))
+        reponse = client.post(
+            f"/upload/{t}/{v}/{type_doc}",
+            data={'fichier': (io.BytesIO(contenu_upload), "bench.pdf")},
+            headers={'X-Noria-Admin': app.MOT_DE_PASSE_ADMIN},
+            content_type='multipart/form-data'
+        )
+        assert reponse.status_code == 202, reponse.data
+        return reponse.get_json()
+
+    def upload_termine():
+        # Réponse de la route + rangement du fichier par le travail en arrière-plan
+        suivi = upload()['suivi']
+        while True:
+            travail = client.get(suivi).get_json()
+            if travail['etat'] in ('termine', 'erreur'):
+                return travail
+            time.sleep(0.005)
+
+    def sauvegarde():
+        app.sauvegarder_donnees(app.charger_donnees())
+
+    def rafraichissement_upload():
+        # Aller-retour du navigateur après un upload : btn-upload-termine incrémente refresh-trigger,
+        # qui reconstruit l'inspecteur et la cellule de complétude de la case sélectionnée
+        t, v = cellule()
+        case = {'row': t, 'column': v}
+        refresh = app.upload_file_unified(1, True, 0)
+        return (refresh, app.update_inspecteur(case, True, refresh),
+                app.update_completude_cellule(refresh, case, *etat_page))
+
+    return {
+        'matrice_statuts': app.matrice_statuts,
+        'charger_donnees': app.charger_donnees,
+        'charger_donnees_froid': lambda: app.cache_statuts.stockage.charger()[0],
+        'sauvegarder_donnees': sauvegarde,
+        'matrice_completude': app.matrice_completude,
+        'create_tableau_page': app.create_tableau_page,
+        'create_analyse_page': app.create_analyse_page,
+        'indicateurs_froid': lambda: app._indicateurs.__wrapped__(None, app.pd.Timestamp.now().normalize()),
+        'update_grille': lambda: app.update_grille(*etat_page),
+        'update_grille_filtre_tri': lambda: app.update_grille(
+            1, app.PAGE_TAILLE, [{'column_id': 't1', 'direction': 'desc'}], '{t0} = "OK"', None),
+        'create_inspecteur_box': inspecteur,
+        'update_folder_content': dossier,
+        'save_status': statut,
+        'save_status_lot_12': statut_lot,
+        'upload_route_1mo': upload,
+        'upload_route_1mo_termine': upload_termine,
+        'rafraichissement_upload': rafraichissement_upload
+    }
+
+def executer_scenario(nb_villas, nb_fichiers, repetitions, graine, garder, nb_taches=None):
+    """Exécuté dans le sous-processus : prépare le projet, importe app, mesure"""
+    dossier = tempfile.mkdtemp(prefix="bench-noria-")
+    os.environ["NORIA_PROJET"] = ecrire_schema(dossier, nb_villas, taches_pour_fichiers(nb_villas, nb_fichiers, nb_taches))
+    os.chdir(dossier)
+    sys.path.insert(0, DOSSIER_APP)
+    import app
+
+    alea = random.Random(graine)
+    debut = time.perf_counter()
+    peupler(app, nb_fichiers, alea)
+    preparation = time.perf_counter() - debut
+
+    resultats = {}
+    for nom, operation in operations(app, alea).items():
+        resultats[nom] = mesurer(operation, repetitions)
+        print(f"  {nom:<28} p50={resultats[nom]['p50_ms']:>9.3f} ms  "
+              f"p95={resultats[nom]['p95_ms']:>9.3f} ms  octets={resultats[nom]['octets']}",
+              file=sys.stderr)
+    if not garder:
+        os.chdir(DOSSIER_APP)
+        shutil.rmtree(dossier, ignore_errors=True)
+    return {
+        'villas': nb_villas,
+        'taches': len(app.LISTE_TACHES),
+        'fichiers': nb_fichiers,
+        'stockage': app.BACKEND_STOCKAGE,
+        'preparation_s': round(preparation, 2),
+        'dossier': dossier if garder else None,
+        'operations': resultats
+    }
+
+# =====================================================
+# COMPARAISON ET LANCEMENT
+# =====================================================
+
+def comparer(reference, resultats):
+    """Affiche l'évolution du p50 de chaque opération par rapport à un ancien fichier de résultats"""
+    anciens = {(s['villas'], s['taches'], s['fichiers']): s['operations'] for s in reference['scenarios']}
+    for scenario in resultats['scenarios']:
+        avant = anciens.get((scenario['villas'], scenario['taches'], scenario['fichiers']))
+        if not avant:
+            continue
+        print(f"\n{scenario['villas']} villas, {scenario['taches']} tâches, {scenario['fichiers']} fichiers (p50, nouveau / référence)")
+        for nom, mesure in scenario['operations'].items():
+            if nom in avant and avant[nom]['p50_ms']:
+                ratio = mesure['p50_ms'] / avant[nom]['p50_ms']
+                alerte = "  ⚠️ régression" if ratio > 1.2 else ""
+                print(f"  {nom:<28} x{ratio:.2f}{alerte}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--villas", type=int, nargs="+", default=[108, 500, 2000])
+    parser.add_argument("--fichiers", type=int, nargs="+", default=[0, 10000])
+    parser.add_argument("--taches", type=int,
+                        help="Nombre minimal de tâches (défaut : celles du schéma de l'app, plus si --fichiers l'exige)")
+    parser.add_argument("--repetitions", type=int, default=30)
+    parser.add_argument("--graine", type=int, default=42)
+    parser.add_argument("--sortie", default="bench_noria.json")
+    parser.add_argument("--reference", help="Ancien fichier de résultats à comparer")
+    parser.add_argument("--garder", action="store_true", help="Conserver les projets synthétiques générés")
+    parser.add_argument("--scenario", nargs=2, type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        # Sous-processus : un seul scénario, résultat JSON sur stdout
+        resultat = executer_scenario(*args.scenario, args.repetitions, args.graine, args.garder, args.taches)
+        print(json.dumps(resultat))
+        return
+
+    resultats = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'repetitions': args.repetitions,
+        'scenarios': []
+    }
+    for nb_villas in args.villas:
+        for nb_fichiers in args.fichiers:
+            print(f"▶ {nb_villas} villas, {nb_fichiers} fichiers", file=sys.stderr)
+            sortie = subprocess.run(
+                [sys.executable, __file__, "--scenario", str(nb_villas), str(nb_fichiers),
+                 "--repetitions", str(args.repetitions), "--graine", str(args.graine)]
+                + (["--garder"] if args.garder else [])
+                + (["--taches", str(args.taches)] if args.taches else []),
+                check=True, stdout=subprocess.PIPE, text=True
+            ).stdout
+            resultats['scenarios'].append(json.loads(sortie.strip().splitlines()[-1]))
+
+    with open(args.sortie, "w", encoding="utf-8") as f:
+        json.dump(resultats, f, ensure_ascii=False, indent=2)
+    print(f"Résultats enregistrés dans {args.sortie}", file=sys.stderr)
+
+    if args.reference:
+        with open(args.reference, encoding="utf-8") as f:
+            comparer(json.load(f), resultats)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# app.py crée ses dossiers et ses bases dans le répertoire courant dès l'import :
+# les tests tournent dans un dossier temporaire, jamais dans le dépôt
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+os.chdir(tempfile.mkdtemp(prefix="noria-tests-"))
@@ -0,0 +1,14 @@
+import app
+
+
+def test_mot_de_passe_non_ascii():
+    assert not app.est_admin("mot de passe é")
+    assert not app.est_admin(None)
+    assert app.est_admin(app.MOT_DE_PASSE_ADMIN)
+
+
+def test_entete_admin_non_ascii_refuse():
+    client = app.server.test_client()
+    for route in ("/upload-lot", "/travaux/verification"):
+        reponse = client.post(route, headers={'X-Noria-Admin': "clé"})
+        assert reponse.status_code == 403
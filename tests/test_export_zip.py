@@ -0,0 +1,146 @@
+import io
+import struct
+import zipfile
+import zlib
+
+import pytest
+
+import app
+
+
+class LectureExport(io.RawIOBase):
+    """Fichier en lecture seule sur ExportZip.lire, pour relire l'archive avec zipfile"""
+
+    def __init__(self, export):
+        self.export = export
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, decalage, origine=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.export.taille}[origine]
+        self.position = base + decalage
+        return self.position
+
+    def readinto(self, tampon):
+        fin = min(self.position + len(tampon), self.export.taille)
+        donnees = b"".join(self.export.lire(self.position, fin))
+        tampon[:len(donnees)] = donnees
+        self.position += len(donnees)
+        return len(donnees)
+
+
+def entree(nom, source, horodatage=1700000000):
+    contenu = source if isinstance(source, bytes) else open(source, 'rb').read()
+    return (nom, source, len(contenu), zlib.crc32(contenu), horodatage)
+
+
+@pytest.fixture
+def petit_export(tmp_path):
+    chemin = tmp_path / "plan.pdf"
+    chemin.write_bytes(b"%PDF-1.4 plan " * 5000)
+    contenus = {
+        "manifeste.csv": "Villa;Tâche\r\n".encode('utf-8-sig'),
+        "Villa_1/Réception_v_plan.pdf": chemin.read_bytes(),
+    }
+    export = app.ExportZip([
+        entree("manifeste.csv", contenus["manifeste.csv"]),
+        entree("Villa_1/Réception_v_plan.pdf", str(chemin)),
+    ])
+    return export, contenus
+
+
+def test_relu_par_zipfile(petit_export):
+    export, contenus = petit_export
+    archive = b"".join(export.lire())
+    assert len(archive) == export.taille
+    with zipfile.ZipFile(io.BytesIO(archive)) as z:
+        assert z.testzip() is None
+        assert z.namelist() == list(contenus)
+        for nom, contenu in contenus.items():
+            assert z.read(nom) == contenu
+
+
+def test_lecture_par_plages(petit_export):
+    export, _ = petit_export
+    archive = b"".join(export.lire())
+    for debut, fin in [(0, 1), (10, 70000), (export.taille - 5, export.taille)]:
+        assert b"".join(export.lire(debut, fin)) == archive[debut:fin]
+
+
+def test_entree_de_plus_de_4_gio(tmp_path):
+    # Fichier creux : 4 Gio sans occuper le disque ; le fichier suivant commence au-delà de 4 Gio
+    gros = tmp_path / "gros.pdf"
+    with open(gros, 'wb') as f:
+        f.truncate(app.LIMITE_ZIP32 + 10)
+    petit = tmp_path / "petit.pdf"
+    petit.write_bytes(b"%PDF-1.4 fin")
+    export = app.ExportZip([
+        entree("manifeste.csv", b"Villa;T\r\n"),
+        ("gros.pdf", str(gros), app.LIMITE_ZIP32 + 10, 0, 1700000000),
+        entree("petit.pdf", str(petit)),
+    ])
+
+    with zipfile.ZipFile(LectureExport(export)) as z:
+        infos = {info.filename: info for info in z.infolist()}
+        assert infos["gros.pdf"].file_size == app.LIMITE_ZIP32 + 10
+        assert infos["petit.pdf"].header_offset > app.LIMITE_ZIP32
+        with z.open("gros.pdf") as f:
+            assert f.read(16) == bytes(16)
+        assert z.read("petit.pdf") == b"%PDF-1.4 fin"
+        assert z.read("manifeste.csv") == b"Villa;T\r\n"
+
+    # En-tête local : tailles 0xFFFFFFFF, vraies tailles dans l'extra ZIP64
+    position = infos["gros.pdf"].header_offset
+    entete = b"".join(export.lire(position, position + 30 + len("gros.pdf") + 20))
+    version, taille_compressee, taille, longueur_extra = struct.unpack_from("<H12xII2xH", entete, 4)
+    assert (version, taille_compressee, taille, longueur_extra) == (45, 0xFFFFFFFF, 0xFFFFFFFF, 20)
+    assert struct.unpack_from("<HHQQ", entete, 30 + len("gros.pdf")) == (
+        0x0001, 16, app.LIMITE_ZIP32 + 10, app.LIMITE_ZIP32 + 10)
+
+
+def envoyer(export, etag, **entetes):
+    with app.server.test_request_context(headers=entetes):
+        response = app.envoyer_export(export, etag, "Noria_test.zip")
+        return response, b"".join(response.response)
+
+
+def test_reprise_206(petit_export):
+    export, _ = petit_export
+    archive = b"".join(export.lire())
+    response, corps = envoyer(export, "abc", Range="bytes=100-", **{'If-Range': '"abc"'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f"bytes 100-{export.taille - 1}/{export.taille}"
+    assert corps == archive[100:]
+
+
+def test_if_range_perime_renvoie_tout(petit_export):
+    export, _ = petit_export
+    archive = b"".join(export.lire())
+    response, corps = envoyer(export, "abc", Range="bytes=100-", **{'If-Range': '"ancienne"'})
+    assert response.status_code == 200
+    assert 'Content-Range' not in response.headers
+    assert corps == archive
+
+
+def test_plage_hors_archive(petit_export):
+    export, _ = petit_export
+    response, _ = envoyer(export, "abc", Range=f"bytes={export.taille + 10}-")
+    assert response.status_code == 416
+
+
+def test_nom_export_non_latin1(petit_export):
+    export, _ = petit_export
+    with app.server.test_request_context():
+        response = app.envoyer_export(export, "abc", app.nom_export("5. Gros œuvre"))
+    disposition = response.headers['Content-Disposition']
+    disposition.encode('latin-1')
+    assert "filename*=UTF-8''Noria_5_Gros_%C5%93uvre.zip" in disposition
+    assert 'filename=Noria_5_Gros_uvre.zip' in disposition
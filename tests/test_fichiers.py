@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+import app
+from conftest import RACINE
+
+
+def test_x_sendfile_active_dans_la_configuration(tmp_path):
+    sortie = subprocess.run(
+        [sys.executable, "-c", "import app; print(app.server.config['USE_X_SENDFILE'])"],
+        cwd=tmp_path, env=dict(os.environ, NORIA_X_SENDFILE="1", PYTHONPATH=RACINE),
+        capture_output=True, text=True, check=True
+    ).stdout
+    assert sortie.strip().endswith("True")
+
+
+def test_x_accel_nom_non_latin1(monkeypatch):
+    monkeypatch.setattr(app, 'X_ACCEL_PREFIXE', "/interne")
+    monkeypatch.setattr(app, 'resoudre_document', lambda filename: (None, "0" * 64))
+    with app.server.test_request_context():
+        response = app.servir_pdf("5._Gros_œuvre_v_plan.pdf", telechargement=True)
+    disposition = response.headers['Content-Disposition']
+    disposition.encode('latin-1')
+    assert disposition.startswith("attachment; filename=5._Gros_uvre_v_plan.pdf")
+    assert "filename*=UTF-8''5._Gros_%C5%93uvre_v_plan.pdf" in disposition
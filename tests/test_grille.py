@@ -0,0 +1,26 @@
+import app
+
+
+def test_type_retire_du_schema_ignore(monkeypatch):
+    tache, villa = app.LISTE_TACHES[0], app.LISTE_VILLAS[0]
+    presents = {(tache, villa, type_doc): "0" * 64 for type_doc in app.get_types_docs_pour_tache(tache)}
+    # Document d'un type qui n'est plus dans le schéma : toujours en base, plus compté
+    presents[(tache, villa, "type_retire")] = "1" * 64
+    monkeypatch.setattr(app.index_documents, 'presence', lambda: presents)
+
+    completude = app.matrice_completude()
+    assert completude.loc[tache, villa] == len(app.get_types_docs_pour_tache(tache))
+    grille = app.construire_grille(completude)
+    total = len(app.get_types_docs_pour_tache(tache))
+    assert grille.loc[0, next(iter(app.COLONNES_DOCS))] == f"{total}/{total}"
+
+
+def test_villas_sans_document():
+    tache = app.LISTE_TACHES[1]
+    type_doc = next(iter(app.get_types_docs_pour_tache(tache)))
+    villa = app.LISTE_VILLAS[2]
+    empreinte, taille = app.depot_documents.stocker(app.io.BytesIO(b"%PDF-1.4 manquants"))
+    app.index_documents.enregistrer([(tache, villa, type_doc, empreinte, taille)])
+    manquantes = app.index_documents.villas_sans_document(tache, type_doc)
+    assert villa not in manquantes
+    assert len(manquantes) == len(app.LISTE_VILLAS) - 1
@@ -0,0 +1,35 @@
+import io
+import re
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def metriques(monkeypatch):
+    monkeypatch.setattr(app, 'METRIQUES_ACTIVES', True)
+    monkeypatch.setattr(app, 'metriques', app.Metriques())
+    return app.metriques
+
+
+def appels_fs(cible):
+    texte = app.metriques.exposition({'hits': 0, 'misses': 0})
+    valeur = re.search(rf'^noria_requete_fs_appels_total{{cible="{re.escape(cible)}"}} (\d+)$', texte, re.M)
+    return int(valeur.group(1)) if valeur else None
+
+
+def test_appels_fs_comptes_par_requete(metriques):
+    tache, villa = app.LISTE_TACHES[0], app.LISTE_VILLAS[0]
+    type_doc = next(iter(app.get_types_docs_pour_tache(tache)))
+    empreinte, taille = app.depot_documents.stocker(io.BytesIO(b"%PDF-1.4 metriques"))
+    app.index_documents.enregistrer([(tache, villa, type_doc, empreinte, taille)])
+    client = app.server.test_client()
+
+    nom = app.nom_fichier_document(tache, villa, type_doc)
+    assert client.get(f"/download/{nom}").status_code == 200
+    assert appels_fs("/download/<path:filename>") >= 1
+
+    reponse = client.get(f"/export/villa/{app.INDEX_VILLAS[villa]}.zip")
+    reponse.get_data()
+    assert appels_fs("/export/villa/<int:villa_idx>.zip") >= 2
@@ -0,0 +1,79 @@
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import app
+
+
+@pytest.fixture
+def stockage(tmp_path, monkeypatch):
+    # Un instantané tous les 3 événements : un lot de 3 changements franchit la limite
+    monkeypatch.setattr(app, 'INTERVALLE_INSTANTANES', 3)
+    return app.StockageSQLite(str(tmp_path / "statuts.db"))
+
+
+def codes_ok(nombre):
+    codes = app.matrice_vide()
+    codes[0, :nombre] = app.CODES_STATUTS["OK"]
+    return codes
+
+
+def test_lot_qui_declenche_un_instantane(stockage):
+    stockage.sauvegarder(codes_ok(3))
+    with stockage._connexion() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM instantanes").fetchone()[0] == 2
+    actuel, _ = stockage.charger()
+    assert np.array_equal(stockage.statuts_a_la_date(time.time() + 1), actuel)
+    assert list(app.TABLE_STATUTS[actuel[0, :3]]) == ["OK"] * 3
+
+
+def test_lot_unitaire_qui_declenche_un_instantane(stockage):
+    stockage.ecrire_statuts([(app.LISTE_TACHES[0], villa, "OK") for villa in app.LISTE_VILLAS[:3]])
+    actuel, _ = stockage.charger()
+    assert np.array_equal(stockage.statuts_a_la_date(time.time() + 1), actuel)
+
+
+def test_reparation_instantane_pris_avant_le_lot(stockage, tmp_path):
+    stockage.sauvegarder(codes_ok(3))
+    # Instantané tel que l'écrivait l'ancien ordre (journal avant l'upsert) : tableau d'avant le lot
+    with stockage._connexion() as conn:
+        conn.execute("UPDATE instantanes SET statuts = ? WHERE id_evenement = 3", (zlib.compress(b"[]"),))
+        conn.execute("DELETE FROM meta WHERE cle = 'instantanes_repares'")
+    assert not np.array_equal(stockage.statuts_a_la_date(time.time() + 1), stockage.charger()[0])
+
+    repare = app.StockageSQLite(stockage.chemin)
+    assert np.array_equal(repare.statuts_a_la_date(time.time() + 1), repare.charger()[0])
+
+
+@pytest.fixture
+def heure_locale(monkeypatch):
+    # UTC+14 : minuit local et minuit UTC tombent sur des jours différents
+    monkeypatch.setenv('TZ', "Pacific/Kiritimati")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_evenements_en_heure_locale(stockage, heure_locale):
+    stockage.ecrire_statuts([(app.LISTE_TACHES[0], app.LISTE_VILLAS[0], "Non Conforme")])
+    date = stockage.evenements()['date'].iloc[0]
+    assert abs(app.pd.Timestamp.now() - date) < app.pd.Timedelta(minutes=1)
+
+
+def test_debit_semaine_commence_lundi_minuit_local(stockage, heure_locale, monkeypatch):
+    monkeypatch.setattr(app, 'cache_statuts', app.CacheStatuts(stockage))
+    app._indicateurs.cache_clear()
+    aujourd_hui = app.pd.Timestamp.now().normalize()
+    lundi = aujourd_hui - app.pd.Timedelta(days=aujourd_hui.weekday())
+    # Lundi 0 h 30 heure locale : encore dimanche en UTC
+    date = datetime.timestamp(lundi.to_pydatetime()) + 1800
+    with stockage._connexion() as conn:
+        conn.execute("INSERT INTO historique_statuts (date, tache, villa, ancien, nouveau) VALUES (?, ?, ?, ?, ?)",
+                     (date, app.LISTE_TACHES[0], app.LISTE_VILLAS[0], "À faire", "OK"))
+    debit = app.indicateurs_avancement()['debit']
+    assert debit.index[-1] == lundi
+    assert debit["OK"].iloc[-1] == 1
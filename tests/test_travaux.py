@@ -0,0 +1,60 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def file_travaux(tmp_path):
+    # Aucun fil d'exécution : les tests réclament et exécutent eux-mêmes
+    travaux = app.FileTravaux(str(tmp_path / "travaux.db"), 0)
+
+    @travaux.gestionnaire('somme')
+    def somme(parametres, avancer):
+        avancer(0.5, "moitié")
+        return {'total': sum(parametres['nombres'])}
+
+    @travaux.gestionnaire('echec')
+    def echec(parametres, avancer):
+        raise ValueError("fichier illisible")
+
+    return travaux
+
+
+def test_reclamation_exclusive(file_travaux):
+    travail_id = file_travaux.soumettre('somme', {'nombres': [1, 2]})
+    assert file_travaux._reclamer() == (travail_id, 'somme', {'nombres': [1, 2]})
+    # Un autre fil, ou un autre worker sur la même base, ne l'obtient pas
+    assert file_travaux._reclamer() is None
+    autre_worker = app.FileTravaux(file_travaux.chemin, 0)
+    assert autre_worker._reclamer() is None
+    assert file_travaux.etat(travail_id)['etat'] == 'en_cours'
+
+
+def test_reprise_travail_abandonne(file_travaux):
+    travail_id = file_travaux.soumettre('somme', {'nombres': [1]})
+    assert file_travaux._reclamer()[0] == travail_id
+    # Worker arrêté en cours de travail : plus de mise à jour depuis DELAI_REPRISE_TRAVAUX
+    with file_travaux._connexion() as conn:
+        conn.execute("UPDATE travaux SET maj = maj - ?", (app.DELAI_REPRISE_TRAVAUX + 1,))
+    assert file_travaux._reclamer()[0] == travail_id
+
+
+def test_travail_termine(file_travaux):
+    travail_id = file_travaux.soumettre('somme', {'nombres': [1, 2, 3]})
+    file_travaux._executer(*file_travaux._reclamer())
+    etat = file_travaux.etat(travail_id)
+    assert etat['etat'] == 'termine'
+    assert etat['progression'] == 1.0
+    assert etat['resultat'] == {'total': 6}
+    assert file_travaux._reclamer() is None
+
+
+def test_travail_en_erreur(file_travaux):
+    travail_id = file_travaux.soumettre('echec', {})
+    file_travaux._executer(*file_travaux._reclamer())
+    etat = file_travaux.etat(travail_id)
+    assert etat['etat'] == 'erreur'
+    assert etat['message'] == "fichier illisible"
+    assert etat['resultat'] is None
+    # Un travail en erreur n'est pas repris
+    assert file_travaux._reclamer() is None
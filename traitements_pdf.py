@@ -0,0 +1,49 @@
+"""Traitements PDF exécutés dans les processus des pools de Noria.
+
+Module volontairement léger : les pools démarrent en "spawn" et chaque processus fils
+importe ce module, pas l'application Dash entière."""
+import os
+import tempfile
+
+try:
+    # Facultatif : pip install pypdfium2 pillow
+    import pypdfium2 as pdfium
+    import PIL.Image  # noqa: F401 - requis par to_pil()
+except ImportError:
+    pdfium = None
+
+
+def generer_apercu(chemin_pdf, chemin_image, largeur):
+    """Rendu JPEG de la première page du PDF"""
+    if os.path.exists(chemin_image):
+        return
+    pdf = pdfium.PdfDocument(chemin_pdf)
+    try:
+        page = pdf[0]
+        image = page.render(scale=largeur / page.get_width()).to_pil().convert("RGB")
+    finally:
+        pdf.close()
+    fd, chemin_tmp = tempfile.mkstemp(dir=os.path.dirname(chemin_image), prefix=".apercu-", suffix=".part")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, "JPEG", quality=80)
+        os.replace(chemin_tmp, chemin_image)
+    except BaseException:
+        os.remove(chemin_tmp)
+        raise
+
+
+def extraire_texte(chemin_pdf, max_caracteres):
+    """Texte de toutes les pages, tronqué à max_caracteres"""
+    morceaux, total = [], 0
+    pdf = pdfium.PdfDocument(chemin_pdf)
+    try:
+        for page in pdf:
+            texte = page.get_textpage().get_text_bounded()
+            morceaux.append(texte)
+            total += len(texte)
+            if total >= max_caracteres:
+                break
+    finally:
+        pdf.close()
+    return "\n".join(morceaux)[:max_caracteres]